@@ -0,0 +1,113 @@
+""" Find and check the socket of the util warm daemon
+
+This module is shared by util.py, which serves and uses the daemon, and by
+warm_run.py, which uses it without importing util, so that both of them
+agree on where the socket is and on who may be at the other end of it.  At
+import it only loads modules that python itself has already loaded.
+"""
+
+
+#   This is free and unencumbered software released into the public domain.
+#
+#   Anyone is free to copy, modify, publish, use, compile, sell, or
+#   distribute this software, either in source code form or as a compiled
+#   binary, for any purpose, commercial or non-commercial, and by any
+#   means.
+#
+#   In jurisdictions that recognize copyright laws, the author or authors
+#   of this software dedicate any and all copyright interest in the
+#   software to the public domain. We make this dedication for the benefit
+#   of the public at large and to the detriment of our heirs and
+#   successors. We intend this dedication to be an overt act of
+#   relinquishment in perpetuity of all present and future rights to this
+#   software under copyright law.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#   IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+#   OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+#   ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#   OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#   For more information, please refer to <http://unlicense.org/>
+
+
+
+import os
+import stat
+import sys
+
+
+def socket_dir():
+    """ Return a directory for the daemon's socket that only this user can
+        use: $XDG_RUNTIME_DIR or else $TMPDIR/util-daemon-<uid>, created with
+        mode 0700.  Either is checked to be a real directory owned by this
+        user that nobody else can open, since a socket in a directory that
+        other users can write to could be theirs.
+
+        Returns:
+            directory path or None if there is no safe directory
+    """
+    import tempfile                         # pylint: disable=import-outside-toplevel
+    for dir_path in (os.getenv('XDG_RUNTIME_DIR'),
+                     os.path.join(tempfile.gettempdir(), 'util-daemon-{0}'.format(os.getuid()))):
+        if not dir_path:
+            continue
+        try:
+            os.mkdir(dir_path, 0o700)
+        except FileExistsError:
+            pass
+        except OSError:
+            continue
+        try:
+            dir_stat = os.lstat(dir_path)
+        except OSError:
+            continue
+        if stat.S_ISDIR(dir_stat.st_mode) and dir_stat.st_uid == os.getuid() \
+                and dir_stat.st_mode & 0o077 == 0:
+            return dir_path
+    return None
+
+
+def socket_path(util_path):
+    """ Return the unix socket of the warm daemon that serves the scripts
+        using util_path (the real path of their util.py) or None if they
+        should not use it.  It is enabled by setting UTIL_DAEMON to a socket
+        path, or to '1' for a socket in socket_dir() named after the
+        directory of util_path, so that each checkout has its own daemon.
+        It is never used by a script that the daemon itself is running
+        (UTIL_DAEMON_CHILD).
+    """
+    setting = os.getenv('UTIL_DAEMON', '')
+    if setting in ('', '0') or os.getenv('UTIL_DAEMON_CHILD'):
+        return None
+    if setting == '1':
+        dir_path = socket_dir()
+        if dir_path is None:
+            return None
+        import hashlib                      # pylint: disable=import-outside-toplevel
+        key = hashlib.sha256(os.path.dirname(util_path).encode('utf-8')).hexdigest()
+        return os.path.join(dir_path, 'util-daemon-{0}.sock'.format(key[:16]))
+    return setting
+
+
+def peer_uid(sock):
+    """ Return the user id of the process at the other end of a unix
+        socket or None if it can not be found out.
+    """
+    import socket                           # pylint: disable=import-outside-toplevel
+    try:
+        if hasattr(socket, 'SO_PEERCRED'):
+            # Linux: struct ucred {pid_t pid; uid_t uid; gid_t gid;}
+            creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, 12)
+            return int.from_bytes(creds[4:8], sys.byteorder)
+        if sys.platform == 'darwin':
+            # macOS: getsockopt(SOL_LOCAL, LOCAL_PEERCRED) gives struct xucred
+            # {u_int cr_version; uid_t cr_uid; ...} which is what getpeereid()
+            # reads.
+            creds = sock.getsockopt(0, 0x001, 76)
+            return int.from_bytes(creds[4:8], sys.byteorder)
+    except OSError:
+        pass
+    return None
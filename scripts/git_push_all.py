@@ -3,6 +3,12 @@
 
 This module pushes the current git commit on 'master' to all the listed remotes
 defined in the .git/config file allowing for multiple remotes to be used easily.
+Remotes whose remote-tracking branch already matches 'master' are skipped unless
+--force is given.
+
+If a root directory is given as the only argument, every git working tree found
+under it is pushed using a pool of worker processes and a summary table is
+printed at the end.
 
 The module must be executed from the repository that contains 'scripts' directory.
 
@@ -35,9 +41,10 @@ The module must be executed from the repository that contains 'scripts' director
 #   For more information, please refer to <http://unlicense.org/>
 
 
+import collections
 import os
-import subprocess
 import sys
+import time
 sys.path.insert(0, './scripts')
 import util                         # pylint: disable=wrong-import-position
 
@@ -46,6 +53,249 @@ import util                         # pylint: disable=wrong-import-position
 #                           Object Classes and Functions
 ################################################################################
 
+#---------------------------------------------------------------------
+#                       Git References Class
+#---------------------------------------------------------------------
+
+class GitRefs:
+    """ Read-only access to the references of a repository.
+
+        The references are read directly from the files in the '.git'
+        directory (loose refs first and then 'packed-refs') so that checking
+        a reference does not require starting a 'git' process.
+    """
+
+    def __init__(self, repo_dir='.'):
+        self._git_dir = self._find_git_dir(repo_dir)
+        self._common_dir = self._git_dir
+        commondir_path = os.path.join(self._git_dir, 'commondir')
+        if os.path.isfile(commondir_path):
+            # Linked worktrees keep their branches in the main repository.
+            with open(commondir_path) as commondir_file:
+                self._common_dir = os.path.normpath(
+                    os.path.join(self._git_dir, commondir_file.read().strip()))
+        self._packed_refs = None
+
+    @staticmethod
+    def _find_git_dir(repo_dir):
+        git_dir = os.path.join(repo_dir, '.git')
+        if os.path.isfile(git_dir):
+            # Worktrees and submodules use a file pointing at the real directory.
+            with open(git_dir) as git_file:
+                line = git_file.readline().strip()
+            if line.startswith('gitdir:'):
+                git_dir = os.path.normpath(os.path.join(repo_dir, line[7:].strip()))
+        return git_dir
+
+    def _loose_ref(self, ref):
+        for base_dir in (self._git_dir, self._common_dir):
+            try:
+                with open(os.path.join(base_dir, ref)) as ref_file:
+                    return ref_file.readline().strip()
+            except OSError:
+                pass
+        return None
+
+    def packed_refs(self):
+        """ Return the dictionary of reference name to object id from the
+            'packed-refs' file.  The file is only read once.
+        """
+        if self._packed_refs is None:
+            self._packed_refs = {}
+            try:
+                with open(os.path.join(self._common_dir, 'packed-refs')) as packed_file:
+                    for line in packed_file:
+                        # Skip the header and the peeled tag lines ('^<sha>').
+                        if line.startswith('#') or line.startswith('^'):
+                            continue
+                        fields = line.split()
+                        if len(fields) == 2:
+                            self._packed_refs[fields[1]] = fields[0]
+            except OSError:
+                pass
+        return self._packed_refs
+
+    def resolve(self, ref):
+        """ Resolve a reference such as 'refs/heads/master' or 'HEAD'
+            following symbolic references.
+
+            Returns:
+                object id string or None if the reference does not exist
+        """
+        for _ in range(10):
+            value = self._loose_ref(ref)
+            if value is None:
+                return self.packed_refs().get(ref)
+            if not value.startswith('ref:'):
+                return value
+            ref = value[4:].strip()
+        return None
+
+    def is_up_to_date(self, remote, branch='master'):
+        """ Check if the remote-tracking branch already points at the same
+            commit as the local branch which means that a push would not
+            change anything.
+        """
+        local = self.resolve('refs/heads/{0}'.format(branch))
+        if local is None:
+            return False
+        return local == self.resolve('refs/remotes/{0}/{1}'.format(remote, branch))
+
+
+PushResult = collections.namedtuple('PushResult',
+                                    'repo remote status result_code elapsed output')
+
+
+#---------------------------------------------------------------------
+#       find_repos -- Find all git working trees under a directory
+#---------------------------------------------------------------------
+
+def find_repos(root_dir):
+    """ Find every git working tree under the given directory.
+
+        A directory is a working tree if it contains a '.git' directory or
+        file.  The search does not descend into a working tree once it has
+        been found.
+
+        Returns:
+            sorted list of repository directory paths
+    """
+    repos = []
+    for dir_path, dir_names, file_names in os.walk(root_dir):
+        if '.git' in dir_names or '.git' in file_names:
+            repos.append(dir_path)
+            dir_names[:] = []
+        else:
+            dir_names.sort()
+    return sorted(repos)
+
+
+#---------------------------------------------------------------------
+#       push_remote -- Push a branch to one remote
+#---------------------------------------------------------------------
+
+def push_remote(remote, branch='master', capture=False, repo_dir='.'):
+    """ Push the given branch to one remote keeping track of how long it takes.
+
+        :param remote:
+            name of the remote as listed by 'git remote'
+        :param branch:
+            name of the branch to be pushed
+        :param capture:
+            True == collect stdout and stderr instead of letting them through
+            to the terminal.  This is used when several pushes run at the same
+            time so that their output is not interleaved.
+        :param repo_dir:
+            working tree of the repository to push from
+
+        Returns:
+            PushResult
+    """
+    cmd_line = ['git', '-C', repo_dir, 'push', remote, branch]
+    start_time = time.time()
+    output = None
+    try:
+        if capture:
+            result = util.do_sys(cmd_line)
+            output = _output(result.stdout, result.stderr)
+        else:
+            util.do_cmd(cmd_line)
+        result_code = 0
+    except util.subprocess.CalledProcessError as excp:
+        result_code = excp.returncode
+        if capture:
+            output = _output(excp.stdout, excp.stderr)
+    except OSError as excp:
+        result_code = 127
+        output = str(excp)
+    status = 'pushed' if result_code == 0 else 'failed'
+    return PushResult(repo_dir, remote, status, result_code, time.time() - start_time, output)
+
+
+def _output(stdout, stderr):
+    return ((stdout or b'') + (stderr or b'')).decode('utf-8', errors='replace')
+
+
+#---------------------------------------------------------------------
+#       push_remotes -- Push a branch to a list of remotes
+#---------------------------------------------------------------------
+
+def push_remotes(remotes, branch='master', jobs=1, capture=False, repo_dir='.'):
+    """ Push the given branch to all of the remotes.
+
+        :param jobs:
+            maximum number of pushes that may run at the same time.  1 pushes
+            the remotes one after another and 0 pushes all of them at once.
+            Output is always captured when pushes run at the same time.
+
+        Returns:
+            list of PushResult in the order of the remotes
+    """
+    if jobs <= 0:
+        jobs = len(remotes)
+    if jobs <= 1 or len(remotes) <= 1:
+        return [push_remote(remote, branch, capture, repo_dir) for remote in remotes]
+
+    import concurrent.futures               # pylint: disable=import-outside-toplevel
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(push_remote, remote, branch, True, repo_dir)
+                   for remote in remotes]
+        return [future.result() for future in futures]
+
+
+#---------------------------------------------------------------------
+#       push_repo -- Push a branch of one repository to all its remotes
+#---------------------------------------------------------------------
+
+def push_repo(repo_dir, branch='master', jobs=1, exec_flag=True, force_flag=False,
+              capture=False):
+    """ Push the given branch of a repository to all of its remotes skipping
+        the remotes that are already up to date unless force_flag is set.
+
+        Returns:
+            list of PushResult
+    """
+    try:
+        remotes = util.do_sys(['git', '-C', repo_dir, 'remote']).stdout.decode('utf-8')
+    except util.subprocess.CalledProcessError as excp:
+        return [PushResult(repo_dir, '', 'failed', excp.returncode, 0.0,
+                           _output(excp.stdout, excp.stderr))]
+
+    results = []
+    git_refs = GitRefs(repo_dir)
+    stale = []
+    for remote in remotes.splitlines():
+        remote = remote.strip()
+        if not remote:
+            continue
+        if not force_flag and git_refs.is_up_to_date(remote, branch):
+            results.append(PushResult(repo_dir, remote, 'skipped', 0, 0.0, None))
+        elif not exec_flag:
+            results.append(PushResult(repo_dir, remote, 'dry-run', 0, 0.0,
+                                      "Would have executed: git push {0} {1}"
+                                      .format(remote, branch)))
+        else:
+            stale.append(remote)
+    results.extend(push_remotes(stale, branch, jobs, capture, repo_dir))
+    return results
+
+
+#---------------------------------------------------------------------
+#       print_summary -- Print a table of push results
+#---------------------------------------------------------------------
+
+def print_summary(results):
+    """ Print a summary table of the push results.
+    """
+    rows = [("Repository", "Remote", "Status", "RC", "Time")]
+    for push in results:
+        rows.append((push.repo, push.remote, push.status, str(push.result_code),
+                     "{0:.2f}s".format(push.elapsed)))
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    for row in rows:
+        print("  ".join(col.ljust(width) for col, width in zip(row, widths)).rstrip())
+
+
 ################################################################################
 #                           Main Program Processing
 ################################################################################
@@ -54,12 +304,24 @@ class Main(util.MainBase):
     """ Main Command Execution Class
     """
 
+    def arg_parse_setup(self):
+        """ Set up to parse the command line arguments
+        """
+        super().arg_parse_setup()
+        self.arg_prs.add_argument('-j', '--jobs', type=int, default=1, dest='jobs',
+                                  help='Number of remotes to push to at the same time'
+                                       ' (0 == all of them)'
+                                 )
+        self.arg_prs.description = "Push 'master' to all remotes of the current" \
+                                   " repository or, if a root directory is given," \
+                                   " of every repository found under it."
+
     def exec_pgm(self):                                 # pylint: disable=no-self-use
         """ Program Execution
             Warning - Main should override this method and make certain that
             it returns an exit code in self.result_code.
         """
-        if len(self.args.args) > 0:
+        if len(self.args.args) > 1:
             print("ERROR - too many command arguments!")
             self.arg_prs.print_help()
             self.result_code = 0
@@ -68,19 +330,53 @@ class Main(util.MainBase):
         # Perform the specified actions.
         self.result_code = 0
         try:
-            result, remotes = subprocess.getstatusoutput("git remote")
-            if int(result) == 0:
-                for remote in remotes.splitlines():
-                    cmd = "git push {0} master".format(remote.strip())
-                    if self.args.flg_exec:
-                        os.system(cmd)
-                    else:
-                        print("Would have executed:", cmd)
-                    self.result_code = 0
+            if len(self.args.args) > 0:
+                results = self.push_tree(self.args.args[0])
+                print_summary(results)
+            else:
+                results = push_repo('.', 'master', self.args.jobs, self.args.flg_exec,
+                                    self.args.flg_force)
+                self.print_results(results, False)
+            for push in results:
+                self.result_code = max(self.result_code, push.result_code)
         except Exception as excp:  # pylint: disable=broad-except
             print("Execption:", excp)
             self.result_code = 8
 
+    def print_results(self, results, tree_flag):
+        """ Print the captured output and the status of each push.
+        """
+        for push in results:
+            prefix = push.remote
+            if tree_flag:
+                prefix = "{0} {1}".format(push.repo, push.remote)
+            if push.output:
+                for line in push.output.splitlines():
+                    print("{0}: {1}".format(prefix, line))
+            if push.status == 'skipped':
+                print("{0}: up to date, skipped".format(prefix))
+            elif push.status != 'dry-run':
+                print("{0}: rc={1} time={2:.2f}s".format(prefix, push.result_code, push.elapsed))
+
+    def push_tree(self, root_dir):
+        """ Push every repository found under root_dir using a pool of worker
+            processes sized to the number of CPUs.
+        """
+        repos = find_repos(root_dir)
+        if self.args.flg_debug:
+            print("Found {0} repositories under {1}".format(len(repos), root_dir))
+        results = []
+        import concurrent.futures           # pylint: disable=import-outside-toplevel
+        with concurrent.futures.ProcessPoolExecutor(max_workers=os.cpu_count()) as executor:
+            futures = [executor.submit(push_repo, repo, 'master', self.args.jobs,
+                                       self.args.flg_exec, self.args.flg_force, True)
+                       for repo in repos]
+            for future in concurrent.futures.as_completed(futures):
+                repo_results = future.result()
+                self.print_results(repo_results, True)
+                results.extend(repo_results)
+        return sorted(results, key=lambda push: (push.repo, push.remote))
+
 
 ################################################################################
 #                           Command-line interface
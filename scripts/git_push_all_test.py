@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# vi:nu:et:sts=4 ts=4 sw=4
+
+""" Test git_push_all.py
+
+This module tests the git_push_all.py classes and functions.
+
+The module must be executed from the repository that contains the git_push_all.py.
+
+"""
+
+
+#   This is free and unencumbered software released into the public domain.
+#
+#   Anyone is free to copy, modify, publish, use, compile, sell, or
+#   distribute this software, either in source code form or as a compiled
+#   binary, for any purpose, commercial or non-commercial, and by any
+#   means.
+#
+#   In jurisdictions that recognize copyright laws, the author or authors
+#   of this software dedicate any and all copyright interest in the
+#   software to the public domain. We make this dedication for the benefit
+#   of the public at large and to the detriment of our heirs and
+#   successors. We intend this dedication to be an overt act of
+#   relinquishment in perpetuity of all present and future rights to this
+#   software under copyright law.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#   IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+#   OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+#   ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#   OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#   For more information, please refer to <http://unlicense.org/>
+
+
+from contextlib import redirect_stdout
+from io import StringIO
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest import TestCase
+import      git_push_all
+
+
+
+
+################################################################################
+#                               Test Classes
+################################################################################
+
+class testGitRefs(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = self.tmp.name
+        git_dir = os.path.join(self.repo, '.git')
+        os.makedirs(os.path.join(git_dir, 'refs', 'heads'))
+        os.makedirs(os.path.join(git_dir, 'refs', 'remotes', 'origin'))
+        with open(os.path.join(git_dir, 'HEAD'), 'w') as f:
+            f.write('ref: refs/heads/master\n')
+        with open(os.path.join(git_dir, 'refs', 'heads', 'master'), 'w') as f:
+            f.write('a' * 40 + '\n')
+        with open(os.path.join(git_dir, 'refs', 'remotes', 'origin', 'master'), 'w') as f:
+            f.write('a' * 40 + '\n')
+        with open(os.path.join(git_dir, 'packed-refs'), 'w') as f:
+            f.write('# pack-refs with: peeled fully-peeled sorted\n')
+            f.write('b' * 40 + ' refs/remotes/mirror/master\n')
+            f.write('c' * 40 + ' refs/tags/v1\n')
+            f.write('^' + 'd' * 40 + '\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_resolve(self):
+        refs = git_push_all.GitRefs(self.repo)
+        self.assertEqual(refs.resolve('HEAD'), 'a' * 40)
+        self.assertEqual(refs.resolve('refs/tags/v1'), 'c' * 40)
+        self.assertEqual(refs.resolve('refs/heads/missing'), None)
+
+    def test_up_to_date(self):
+        refs = git_push_all.GitRefs(self.repo)
+        self.assertTrue(refs.is_up_to_date('origin'))
+        self.assertFalse(refs.is_up_to_date('mirror'))
+        self.assertFalse(refs.is_up_to_date('unknown'))
+
+    def test_gitdir_file(self):
+        work = os.path.join(self.repo, 'work')
+        os.makedirs(work)
+        with open(os.path.join(work, '.git'), 'w') as f:
+            f.write('gitdir: ../.git\n')
+        refs = git_push_all.GitRefs(work)
+        self.assertTrue(refs.is_up_to_date('origin'))
+
+
+class testFindRepos(TestCase):
+
+    def test_find(self):
+        with tempfile.TemporaryDirectory() as root:
+            for repo in ('a', os.path.join('b', 'c'), os.path.join('a', 'nested')):
+                os.makedirs(os.path.join(root, repo, '.git'))
+            os.makedirs(os.path.join(root, 'd'))
+            with open(os.path.join(root, 'd', '.git'), 'w') as f:
+                f.write('gitdir: ../a/.git\n')
+            repos = git_push_all.find_repos(root)
+            self.assertEqual(repos, [os.path.join(root, 'a'),
+                                     os.path.join(root, 'b', 'c'),
+                                     os.path.join(root, 'd')])
+
+
+class testSummary(TestCase):
+
+    def test_print(self):
+        results = [git_push_all.PushResult('repo', 'origin', 'pushed', 0, 1.5, None),
+                   git_push_all.PushResult('repo', 'mirror', 'failed', 128, 0.25, 'x')]
+        out = StringIO()
+        with redirect_stdout(out):
+            git_push_all.print_summary(results)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[0].startswith('Repository'))
+        self.assertEqual(lines[2].split(), ['repo', 'mirror', 'failed', '128', '0.25s'])
+
+
+class testImports(TestCase):
+
+    def test_lazy(self):
+        code = ("import sys; sys.path.insert(0, {0!r}); import git_push_all; "
+                "print(' '.join(sorted(sys.modules)))").format(
+                    os.path.dirname(os.path.abspath(git_push_all.__file__)))
+        modules = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+                                 check=True).stdout.decode().split()
+        self.assertNotIn('subprocess', modules)
+
+
+class testPush(TestCase):
+    """ Push to local bare repositories, each of which takes PUSH_DELAY
+        seconds to accept a push, and to one remote that does not exist.
+    """
+
+    PUSH_DELAY = 1.0
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.repo = os.path.join(self.tmp.name, 'repo')
+        self.git('init', '-q', '-b', 'master', self.repo)
+        self.git('-C', self.repo, '-c', 'user.name=test', '-c', 'user.email=test@example.com',
+                 'commit', '-q', '--allow-empty', '-m', 'first')
+        for name in ('one', 'two', 'three'):
+            bare = os.path.join(self.tmp.name, name + '.git')
+            self.git('init', '-q', '--bare', bare)
+            hook = os.path.join(bare, 'hooks', 'pre-receive')
+            with open(hook, 'w') as f:
+                f.write('#!/bin/sh\ncat >/dev/null\nsleep {0}\n'.format(self.PUSH_DELAY))
+            os.chmod(hook, 0o755)
+            self.git('-C', self.repo, 'remote', 'add', name, bare)
+
+    def git(self, *args):
+        subprocess.run(['git'] + list(args), check=True)
+
+    def test_jobs(self):
+        remotes = ['one', 'two', 'three']
+        start_time = time.time()
+        results = git_push_all.push_remotes(remotes, jobs=0, repo_dir=self.repo)
+        elapsed = time.time() - start_time
+        self.assertEqual([push.remote for push in results], remotes)
+        self.assertEqual([push.status for push in results], ['pushed'] * 3)
+        self.assertTrue(all(push.output is not None for push in results))
+        self.assertLess(elapsed, self.PUSH_DELAY * 2.5)
+
+    def test_result_code(self):
+        self.git('-C', self.repo, 'remote', 'add', 'missing',
+                 os.path.join(self.tmp.name, 'missing.git'))
+        script = os.path.join(os.path.dirname(os.path.abspath(git_push_all.__file__)),
+                              'git_push_all.py')
+        result = subprocess.run([sys.executable, script, '-j', '4'], cwd=self.repo,
+                                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, check=False)
+        output = result.stdout.decode()
+        self.assertNotEqual(result.returncode, 0, output)
+        for name in ('one', 'two', 'three'):
+            self.assertIn('{0}: rc=0'.format(name), output)
+        self.assertNotIn('missing: rc=0', output)
+        self.assertIn('missing: rc=', output)
+
+
+################################################################################
+#                           Command-line interface
+################################################################################
+
+if '__main__' == __name__:
+    import unittest
+    unittest.main()
+
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+""" Maintain a local Go module mirror
+
+This module fills and reports on a local file system Go module mirror that
+go_get(), go_get_many() and go_build_app() in util.py use when the
+GO_MOD_MIRROR environment variable names it.  Modules that are not in the
+mirror are fetched from $GOPROXY as usual unless GO_MOD_MIRROR_OFFLINE is
+set to 1.
+
+    go_mirror.py [--mirror DIR] prefetch pkg [pkg...]
+    go_mirror.py [--mirror DIR] stats
+    go_mirror.py [--mirror DIR] env
+
+The module must be executed from the repository that contains 'scripts' directory.
+
+"""
+
+
+#   This is free and unencumbered software released into the public domain.
+#
+#   Anyone is free to copy, modify, publish, use, compile, sell, or
+#   distribute this software, either in source code form or as a compiled
+#   binary, for any purpose, commercial or non-commercial, and by any
+#   means.
+#
+#   In jurisdictions that recognize copyright laws, the author or authors
+#   of this software dedicate any and all copyright interest in the
+#   software to the public domain. We make this dedication for the benefit
+#   of the public at large and to the detriment of our heirs and
+#   successors. We intend this dedication to be an overt act of
+#   relinquishment in perpetuity of all present and future rights to this
+#   software under copyright law.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#   IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+#   OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+#   ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#   OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#   For more information, please refer to <http://unlicense.org/>
+
+
+
+import os
+import sys
+sys.path.insert(0, './scripts')
+import util                         # pylint: disable=wrong-import-position
+
+
+################################################################################
+#                           Main Program Processing
+################################################################################
+
+class Main(util.MainBase):
+    """ Main Command Execution Class
+    """
+
+    def arg_parse_setup(self):
+        """ Set up to parse the command line arguments
+        """
+        super().arg_parse_setup()
+        self.arg_prs.add_argument('-m', '--mirror', dest='mirror',
+                                  default=os.getenv('GO_MOD_MIRROR'),
+                                  help='Mirror directory (default is $GO_MOD_MIRROR)'
+                                 )
+        self.arg_prs.add_argument('-j', '--jobs', type=int, default=4, dest='jobs',
+                                  help='Number of packages to fetch at the same time'
+                                 )
+        self.arg_prs.description = "Commands: 'prefetch pkg...' fetches packages and their" \
+                                   " dependencies into the mirror, 'stats' prints the hit" \
+                                   " rate and 'env' prints the environment settings that" \
+                                   " use the mirror."
+
+    def exec_pgm(self):                                 # pylint: disable=no-self-use
+        """ Program Execution
+            Warning - Main should override this method and make certain that
+            it returns an exit code in self.result_code.
+        """
+        if len(self.args.args) == 0 or not self.args.mirror:
+            print("ERROR - a command and a mirror directory are required!")
+            self.arg_prs.print_help()
+            self.result_code = 4
+            return
+
+        mirror = util.GoModMirror(self.args.mirror, os.getenv('GO_MOD_MIRROR_OFFLINE') == '1')
+        cmd = self.args.args[0]
+        self.result_code = 0
+        if cmd == 'prefetch':
+            pkgs = self.args.args[1:]
+            if not self.args.flg_exec:
+                for pkg in pkgs:
+                    print("Would have fetched:", pkg)
+                return
+            results = mirror.prefetch(pkgs, self.args.jobs)
+            for pkg in pkgs:
+                err = results[pkg]
+                if err is None:
+                    print("{0}: ok".format(pkg))
+                else:
+                    err.stdout()
+                    self.result_code = 8
+        elif cmd == 'stats':
+            stats = mirror.stats()
+            print("Mirror:   {0}".format(mirror.path))
+            print("Hits:     {0}".format(stats['hits']))
+            print("Misses:   {0}".format(stats['misses']))
+            print("Hit Rate: {0:.1%}".format(stats['hit_rate']))
+        elif cmd == 'env':
+            print("export GO_MOD_MIRROR={0}".format(mirror.path))
+            for name, value in sorted(mirror.env().items()):
+                print("export {0}={1}".format(name, value))
+        else:
+            print("ERROR - unknown command: {0}".format(cmd))
+            self.result_code = 4
+
+
+################################################################################
+#                           Command-line interface
+################################################################################
+
+if  __name__ == '__main__':
+    Main().run()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+""" Measure the system calls made by util.absolute_path
+
+This module resolves many paths that share a few parent directories with
+create_dirs set, the way the copy and install scripts do.  It counts the
+os.stat() and os.mkdir() calls made by the original absolute_path(), which
+checked and created the directory on every call, and by the current
+absolute_path() and absolute_paths(), which remember converted paths and
+known directories.
+
+    path_bench.py [-n COUNT] [--dirs DIRS]
+"""
+
+
+#   This is free and unencumbered software released into the public domain.
+#
+#   Anyone is free to copy, modify, publish, use, compile, sell, or
+#   distribute this software, either in source code form or as a compiled
+#   binary, for any purpose, commercial or non-commercial, and by any
+#   means.
+#
+#   In jurisdictions that recognize copyright laws, the author or authors
+#   of this software dedicate any and all copyright interest in the
+#   software to the public domain. We make this dedication for the benefit
+#   of the public at large and to the detriment of our heirs and
+#   successors. We intend this dedication to be an overt act of
+#   relinquishment in perpetuity of all present and future rights to this
+#   software under copyright law.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#   IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+#   OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+#   ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#   OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#   For more information, please refer to <http://unlicense.org/>
+
+
+
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, './scripts')
+import util                         # pylint: disable=wrong-import-position
+
+
+################################################################################
+#                           Object Classes and Functions
+################################################################################
+
+def legacy_absolute_path(path, create_dirs=False):
+    """ absolute_path() as it was before its results were remembered.
+    """
+    work_path = os.path.normpath(path)
+    work_path = os.path.expanduser(work_path)
+    work_path = os.path.expandvars(work_path)
+    work_path = os.path.abspath(work_path)
+    if create_dirs:
+        dir_path = os.path.dirname(work_path)
+        if len(dir_path) > 0:
+            if not os.path.exists(dir_path):
+                os.makedirs(dir_path)
+    return work_path
+
+
+class SyscallCounter:
+    """ Count the calls of os.stat() and os.mkdir() (which os.path.exists(),
+        os.path.isdir() and os.makedirs() use) while in a with block.
+    """
+
+    def __init__(self):
+        self.counts = {'stat': 0, 'mkdir': 0}
+        self._saved = {}
+
+    def __enter__(self):
+        for name in self.counts:
+            func = getattr(os, name)
+            self._saved[name] = func
+            setattr(os, name, self._counted(name, func))
+        return self
+
+    def __exit__(self, *exc_info):
+        for name, func in self._saved.items():
+            setattr(os, name, func)
+        return False
+
+    def _counted(self, name, func):
+        def counted(*args, **kwargs):
+            self.counts[name] += 1
+            return func(*args, **kwargs)
+        return counted
+
+
+def measure(resolve, paths):
+    """ Resolve the paths in a new directory tree.
+
+        Returns:
+            (seconds, dict of system call counts)
+    """
+    util.forget_paths()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        os.environ['PATH_BENCH_DIR'] = tmp_dir
+        start_time = time.perf_counter()
+        with SyscallCounter() as counter:
+            resolve(paths)
+        return time.perf_counter() - start_time, counter.counts
+
+
+################################################################################
+#                           Main Program Processing
+################################################################################
+
+class Main(util.MainBase):
+    """ Main Command Execution Class
+    """
+
+    def arg_parse_setup(self):
+        """ Set up to parse the command line arguments
+        """
+        super().arg_parse_setup()
+        self.arg_prs.add_argument('-n', '--count', type=int, default=20000, dest='count',
+                                  help='Number of paths to resolve'
+                                 )
+        self.arg_prs.add_argument('--dirs', type=int, default=50, dest='dirs',
+                                  help='Number of directories that the paths share'
+                                 )
+
+    def exec_pgm(self):                                 # pylint: disable=no-self-use
+        """ Program Execution
+            Warning - Main should override this method and make certain that
+            it returns an exit code in self.result_code.
+        """
+        paths = ['$PATH_BENCH_DIR/d{0}/sub/f{1}.txt'.format(i % self.args.dirs, i)
+                 for i in range(self.args.count)]
+        forms = [
+            ('original', lambda paths: [legacy_absolute_path(p, True) for p in paths]),
+            ('absolute_path', lambda paths: [util.absolute_path(p, True) for p in paths]),
+            ('absolute_paths', lambda paths: util.absolute_paths(paths, True)),
+        ]
+        self.result_code = 0
+        print("{0} paths in {1} directories".format(self.args.count, self.args.dirs))
+        print("{0:<16} {1:>8} {2:>8} {3:>10}".format('form', 'stat', 'mkdir', 'time(ms)'))
+        for name, resolve in forms:
+            seconds, counts = measure(resolve, paths)
+            print("{0:<16} {1:>8} {2:>8} {3:>10.1f}".format(
+                name, counts['stat'], counts['mkdir'], seconds * 1000.0))
+
+
+################################################################################
+#                           Command-line interface
+################################################################################
+
+if  __name__ == '__main__':
+    Main().run()
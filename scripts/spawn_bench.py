@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+""" Measure the cost of starting commands through util.do_sys
+
+This module compares the latency of running a trivial command through
+util.do_sys() as a shell command line string (/bin/sh is started first)
+and as an argv list (the program is started directly, which lets
+subprocess use posix_spawn()).
+
+    spawn_bench.py [-n COUNT] [program [arg...]]
+
+The default program is 'env'.  Shell builtins such as 'true' are not a fair
+test since the shell runs them without starting another process.
+
+The module must be executed from the repository that contains 'scripts' directory.
+
+"""
+
+
+#   This is free and unencumbered software released into the public domain.
+#
+#   Anyone is free to copy, modify, publish, use, compile, sell, or
+#   distribute this software, either in source code form or as a compiled
+#   binary, for any purpose, commercial or non-commercial, and by any
+#   means.
+#
+#   In jurisdictions that recognize copyright laws, the author or authors
+#   of this software dedicate any and all copyright interest in the
+#   software to the public domain. We make this dedication for the benefit
+#   of the public at large and to the detriment of our heirs and
+#   successors. We intend this dedication to be an overt act of
+#   relinquishment in perpetuity of all present and future rights to this
+#   software under copyright law.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#   IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+#   OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+#   ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#   OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#   For more information, please refer to <http://unlicense.org/>
+
+
+
+import sys
+import time
+sys.path.insert(0, './scripts')
+import util                         # pylint: disable=wrong-import-position
+
+
+################################################################################
+#                           Object Classes and Functions
+################################################################################
+
+def time_spawns(cmd_line, count):
+    """ Run a command count times through util.do_sys.
+
+        Returns:
+            average seconds per command
+    """
+    util.do_sys(cmd_line)                   # warm up the caches
+    start_time = time.perf_counter()
+    for _ in range(count):
+        util.do_sys(cmd_line)
+    return (time.perf_counter() - start_time) / count
+
+
+################################################################################
+#                           Main Program Processing
+################################################################################
+
+class Main(util.MainBase):
+    """ Main Command Execution Class
+    """
+
+    def arg_parse_setup(self):
+        """ Set up to parse the command line arguments
+        """
+        super().arg_parse_setup()
+        self.arg_prs.add_argument('-n', '--count', type=int, default=200, dest='count',
+                                  help='Number of times to run each form of the command'
+                                 )
+
+    def exec_pgm(self):                                 # pylint: disable=no-self-use
+        """ Program Execution
+            Warning - Main should override this method and make certain that
+            it returns an exit code in self.result_code.
+        """
+        argv = self.args.args or ['env']
+
+        self.result_code = 0
+        shell_time = time_spawns(util.cmd_str(argv), self.args.count)
+        argv_time = time_spawns(argv, self.args.count)
+        print("Spawns per form:  {0}".format(self.args.count))
+        print("shell string:     {0:8.3f} ms".format(shell_time * 1000.0))
+        print("argv list:        {0:8.3f} ms".format(argv_time * 1000.0))
+        print("saved per spawn:  {0:8.3f} ms ({1:.0%})".format(
+            (shell_time - argv_time) * 1000.0, 1.0 - argv_time / shell_time))
+
+
+################################################################################
+#                           Command-line interface
+################################################################################
+
+if  __name__ == '__main__':
+    Main().run()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+""" Measure the startup time of the scripts that use util
+
+This module checks how long 'import util' takes, using the interpreter's
+-X importtime report, and how long cold runs of 'git_push_all.py --noexc'
+take.  It fails if either is over its budget, so a slow import that
+creeps into util is noticed.
+
+    startup_bench.py [-n COUNT] [--budget MS] [--import-budget MS]
+
+Run it from the top of the repository like the other scripts.  Note that
+if PYTHONDONTWRITEBYTECODE is set, util.py is compiled on every start.
+"""
+
+
+#   This is free and unencumbered software released into the public domain.
+#
+#   Anyone is free to copy, modify, publish, use, compile, sell, or
+#   distribute this software, either in source code form or as a compiled
+#   binary, for any purpose, commercial or non-commercial, and by any
+#   means.
+#
+#   In jurisdictions that recognize copyright laws, the author or authors
+#   of this software dedicate any and all copyright interest in the
+#   software to the public domain. We make this dedication for the benefit
+#   of the public at large and to the detriment of our heirs and
+#   successors. We intend this dedication to be an overt act of
+#   relinquishment in perpetuity of all present and future rights to this
+#   software under copyright law.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#   IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+#   OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+#   ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#   OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#   For more information, please refer to <http://unlicense.org/>
+
+
+
+import os
+import statistics
+import sys
+import time
+sys.path.insert(0, './scripts')
+import util                         # pylint: disable=wrong-import-position
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Modules that util only imports when they are first used.
+LAZY_MODULES = ('argparse', 'concurrent.futures', 'http.client', 'json', 'subprocess')
+
+
+################################################################################
+#                           Object Classes and Functions
+################################################################################
+
+def import_times():
+    """ Import util in a new interpreter with -X importtime.
+
+        Returns:
+            dict of module name to cumulative import time in microseconds
+    """
+    code = 'import sys; sys.path.insert(0, {0!r}); import util'.format(SCRIPTS_DIR)
+    result = util.do_sys([sys.executable, '-X', 'importtime', '-c', code])
+    times = {}
+    for line in result.stderr.decode('utf-8', errors='replace').splitlines():
+        fields = line.split('|')
+        if len(fields) != 3 or not line.startswith('import time:'):
+            continue
+        try:
+            times[fields[2].strip()] = int(fields[1])
+        except ValueError:
+            pass                            # the heading line
+    return times
+
+
+def time_runs(cmd_line, count):
+    """ Run a command count times, each in a new interpreter.
+
+        Returns:
+            median seconds per run
+    """
+    times = []
+    for _ in range(count):
+        start_time = time.perf_counter()
+        util.do_sys(cmd_line)
+        times.append(time.perf_counter() - start_time)
+    return statistics.median(times)
+
+
+################################################################################
+#                           Main Program Processing
+################################################################################
+
+class Main(util.MainBase):
+    """ Main Command Execution Class
+    """
+
+    def arg_parse_setup(self):
+        """ Set up to parse the command line arguments
+        """
+        super().arg_parse_setup()
+        self.arg_prs.add_argument('-n', '--count', type=int, default=20, dest='count',
+                                  help='Number of cold runs of git_push_all.py'
+                                 )
+        self.arg_prs.add_argument('--budget', type=float, default=100.0, dest='budget',
+                                  help='Maximum median run time in ms'
+                                 )
+        self.arg_prs.add_argument('--import-budget', type=float, default=30.0,
+                                  dest='import_budget',
+                                  help='Maximum time to import util in ms'
+                                 )
+
+    def exec_pgm(self):                                 # pylint: disable=no-self-use
+        """ Program Execution
+            Warning - Main should override this method and make certain that
+            it returns an exit code in self.result_code.
+        """
+        self.result_code = 0
+        times = import_times()
+        import_ms = times.get('util', 0) / 1000.0
+        eager = [name for name in LAZY_MODULES if name in times]
+        slowest = sorted((t, name) for name, t in times.items() if name != 'util')[-5:]
+        print("import util:      {0:8.1f} ms (budget {1:.1f} ms)".format(
+            import_ms, self.args.import_budget))
+        for import_time, name in reversed(slowest):
+            print("    {0:<24} {1:8.1f} ms".format(name, import_time / 1000.0))
+        if eager:
+            print("Error: util imported {0} at startup".format(', '.join(eager)))
+            self.result_code = 8
+
+        cmd_line = [sys.executable, os.path.join(SCRIPTS_DIR, 'git_push_all.py'), '--noexc']
+        run_ms = time_runs(cmd_line, self.args.count) * 1000.0
+        print("git_push_all.py:  {0:8.1f} ms median of {1} runs (budget {2:.1f} ms)".format(
+            run_ms, self.args.count, self.args.budget))
+
+        if import_ms > self.args.import_budget or run_ms > self.args.budget:
+            print("Error: startup is over budget")
+            self.result_code = 8
+
+
+################################################################################
+#                           Command-line interface
+################################################################################
+
+if  __name__ == '__main__':
+    Main().run()
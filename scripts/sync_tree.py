@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+""" Copy settings and applications to another directory tree
+
+This module copies a directory tree, such as a home directory, to another
+location (a new machine's disk, a backup) with util.sync_tree().  Files
+that are already the same in the destination are skipped so running it
+again only copies what changed.
+
+    sync_tree.py [-j JOBS] [--checksum] src dst
+"""
+
+
+#   This is free and unencumbered software released into the public domain.
+#
+#   Anyone is free to copy, modify, publish, use, compile, sell, or
+#   distribute this software, either in source code form or as a compiled
+#   binary, for any purpose, commercial or non-commercial, and by any
+#   means.
+#
+#   In jurisdictions that recognize copyright laws, the author or authors
+#   of this software dedicate any and all copyright interest in the
+#   software to the public domain. We make this dedication for the benefit
+#   of the public at large and to the detriment of our heirs and
+#   successors. We intend this dedication to be an overt act of
+#   relinquishment in perpetuity of all present and future rights to this
+#   software under copyright law.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#   IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+#   OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+#   ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#   OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#   For more information, please refer to <http://unlicense.org/>
+
+
+
+import sys
+sys.path.insert(0, './scripts')
+import util                         # pylint: disable=wrong-import-position
+
+
+################################################################################
+#                           Main Program Processing
+################################################################################
+
+class Main(util.MainBase):
+    """ Main Command Execution Class
+    """
+
+    def arg_parse_setup(self):
+        """ Set up to parse the command line arguments
+        """
+        super().arg_parse_setup()
+        self.arg_prs.add_argument('-j', '--jobs', type=int, default=8, dest='jobs',
+                                  help='Number of files to copy at the same time'
+                                 )
+        self.arg_prs.add_argument('--checksum', action='store_true', dest='flg_checksum',
+                                  default=False,
+                                  help='Compare file contents instead of mtimes'
+                                 )
+
+    def exec_pgm(self):                                 # pylint: disable=no-self-use
+        """ Program Execution
+            Warning - Main should override this method and make certain that
+            it returns an exit code in self.result_code.
+        """
+        if len(self.args.args) != 2:
+            print("Error: give the source and destination directories")
+            self.result_code = 4
+            return
+        src, dst = self.args.args
+        if not self.args.flg_exec:
+            print("Would copy {0} to {1}".format(src, dst))
+            self.result_code = 0
+            return
+
+        result = util.sync_tree(src, dst, jobs=self.args.jobs, checksum=self.args.flg_checksum,
+                                trace_flag=self.args.flg_debug)
+        for path, msg in result.errors:
+            print("Error: {0}: {1}".format(path, msg))
+        print(util.sync_report(result))
+        self.result_code = 8 if result.errors else 0
+
+
+################################################################################
+#                           Command-line interface
+################################################################################
+
+if  __name__ == '__main__':
+    Main().run()
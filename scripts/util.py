@@ -35,21 +35,154 @@ scripts.
 #   For more information, please refer to <http://unlicense.org/>
 
 
-import argparse
-import json
+import codecs
+import collections
+import functools
 import os
-import subprocess
+import stat
 import sys
+import threading
 import time
+try:
+    import fcntl
+except ImportError:                             # pragma: no cover - not POSIX
+    fcntl = None
+import daemon_socket
+
+
+class _LazyModule:
+    """ Stand-in for a module that is only imported when one of its
+        attributes is first used.  The module then replaces the stand-in in
+        this module's globals so later uses cost nothing extra.  Scripts
+        that never need, for instance, http.client or argparse do not pay
+        for importing them.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        __import__(self._name)
+        top_name = self._name.split('.')[0]
+        module = sys.modules[top_name]
+        globals()[top_name] = module
+        return getattr(module, attr)
+
+
+argparse = _LazyModule('argparse')
+concurrent = _LazyModule('concurrent.futures')
+glob = _LazyModule('glob')
+hashlib = _LazyModule('hashlib')
+http = _LazyModule('http.client')
+json = _LazyModule('json')
+re = _LazyModule('re')
+selectors = _LazyModule('selectors')
+shlex = _LazyModule('shlex')
+shutil = _LazyModule('shutil')
+socket = _LazyModule('socket')
+subprocess = _LazyModule('subprocess')
+tempfile = _LazyModule('tempfile')
+urllib = _LazyModule('urllib.parse')
 
 
 #---------------------------------------------------------------------
 #       absolute_path -- Convert a Path to an absolute path
 #---------------------------------------------------------------------
 
+# Converted paths: path -> (absolute path, ((env name, value), ...), cwd or
+# None).  An entry is only used while the environment variables that the
+# path refers to and, for a relative path, the current directory are the
+# same.
+_path_cache = {}
+# Directories that are known to exist because they were created or checked.
+_known_dirs = set()
+
+
+def _path_vars(path):
+    """ Return the names of the environment variables that path refers to.
+    """
+    names = []
+    if '$' in path:
+        for match in re.finditer(r'\$(\w+|\{[^}]*\})', path):
+            names.append(match.group(1).strip('{}'))
+    if path.startswith('~'):
+        names.append('HOME')
+    return tuple(names)
+
+
+def _convert_path(path):
+    """ Return path as an absolute path.  A path ending in a plain file name
+        is converted by converting its directory, which many paths share,
+        and joining the name to it.  A name starting with '~' is not plain
+        since normpath() may drop the directory in front of it ('./~') and
+        leave it to expanduser().
+    """
+    head, tail = os.path.split(path)
+    if head and tail not in ('', '.', '..') and '$' not in tail and '}' not in tail \
+            and not tail.startswith('~'):
+        return os.path.join(_convert_dir(head), tail)
+    return _convert_dir(path)
+
+
+def _convert_dir(path):
+    """ Return path as an absolute path, using the cache when possible.
+    """
+    entry = _path_cache.get(path)
+    if entry is not None:
+        work_path, env, cwd = entry
+        if all(os.environ.get(name) == value for name, value in env) \
+                and (cwd is None or cwd == os.getcwd()):
+            return work_path
+
+    work_path = os.path.normpath(path)
+    work_path = os.path.expanduser(work_path)
+    work_path = os.path.expandvars(work_path)
+    cwd = None
+    if not os.path.isabs(work_path):
+        cwd = os.getcwd()
+    work_path = os.path.abspath(work_path)
+    env = tuple((name, os.environ.get(name)) for name in _path_vars(path))
+    _path_cache[path] = (work_path, env, cwd)
+    return work_path
+
+
+def _make_dirs(dir_path, trace_flag=False):
+    """ Make certain that a directory exists.  Directories that are already
+        known to exist are not checked again.  As before the cache was
+        added, a file that already exists at dir_path is left alone and
+        nothing is created.
+    """
+    if dir_path in _known_dirs:
+        return
+    if not os.path.exists(dir_path):
+        if trace_flag:
+            print("\tCreating directories:", dir_path)
+        os.makedirs(dir_path, exist_ok=True)
+    elif not os.path.isdir(dir_path):
+        return
+    while dir_path not in _known_dirs:
+        _known_dirs.add(dir_path)
+        parent = os.path.dirname(dir_path)
+        if parent == dir_path:
+            break
+        dir_path = parent
+
+
+def forget_paths():
+    """ Clear the converted paths and the known directories.  This must be
+        called if directories that absolute_path() created or checked are
+        removed.
+    """
+    _path_cache.clear()
+    _known_dirs.clear()
+
+
 def absolute_path(path, create_dirs=False, trace_flag=False):
     """ Convert Path to an absolute path creating subdirectories if needed
 
+    The conversion of each path is remembered (see _convert_path()) and
+    directories are only checked or created once per process.
+
     Returns:
         path string for successful completion or None for error
     """
@@ -57,18 +190,12 @@ def absolute_path(path, create_dirs=False, trace_flag=False):
         print("absolutePath(%s)" % path)
 
     # Convert the path.
-    work_path = os.path.normpath(path)
-    work_path = os.path.expanduser(work_path)
-    work_path = os.path.expandvars(work_path)
-    work_path = os.path.abspath(work_path)
+    work_path = _convert_path(path)
 
     if create_dirs:
         dir_path = os.path.dirname(work_path)
         if len(dir_path) > 0:
-            if not os.path.exists(dir_path):
-                if trace_flag:
-                    print("\tCreating directories:", dir_path)
-                os.makedirs(dir_path)
+            _make_dirs(dir_path, trace_flag)
 
     # Return to caller.
     if trace_flag:
@@ -76,6 +203,236 @@ def absolute_path(path, create_dirs=False, trace_flag=False):
     return work_path
 
 
+def absolute_paths(paths, create_dirs=False, trace_flag=False):
+    """ Convert several Paths to absolute paths creating the subdirectories
+        if needed.  Each distinct directory is created or checked once,
+        parents before children.
+
+    Returns:
+        list of path strings in the order given
+    """
+    work_paths = [_convert_path(path) for path in paths]
+    if create_dirs:
+        dir_paths = set(os.path.dirname(work_path) for work_path in work_paths)
+        for dir_path in sorted(dir_paths - _known_dirs):
+            if len(dir_path) > 0:
+                _make_dirs(dir_path, trace_flag)
+    if trace_flag:
+        print("...end of absolutePaths: {0} paths".format(len(work_paths)))
+    return work_paths
+
+
+#---------------------------------------------------------------------
+#       sync_tree -- Copy a directory tree incrementally
+#---------------------------------------------------------------------
+
+SyncResult = collections.namedtuple('SyncResult', 'files copied skipped bytes elapsed errors')
+
+
+def _copy_data(fd_in, fd_out, size):
+    """ Copy size bytes between two file descriptors inside the kernel if
+        possible, with copy_file_range() (which can share blocks on file
+        systems that support it) or else sendfile().  Only if neither works
+        for these files is the data read and written here.
+    """
+    copied = 0
+    for func in ('copy_file_range', 'sendfile'):
+        if not hasattr(os, func):
+            continue
+        try:
+            while copied < size:
+                if func == 'copy_file_range':
+                    count = os.copy_file_range(fd_in, fd_out, min(size - copied, 1 << 30))
+                else:
+                    count = os.sendfile(fd_out, fd_in, copied, min(size - copied, 1 << 30))
+                if count == 0:
+                    return
+                copied += count
+            return
+        except OSError:
+            if copied > 0:
+                raise
+    while True:
+        data = os.read(fd_in, 1 << 20)
+        if not data:
+            return
+        while data:
+            data = data[os.write(fd_out, data):]
+
+
+def _copy_file(src_path, dst_path, src_stat):
+    """ Copy a file to a temporary file next to dst_path, give it the mode
+        and times of the source and move it into place.
+    """
+    tmp_path = os.path.join(os.path.dirname(dst_path),
+                            '.{0}.{1}.sync'.format(os.path.basename(dst_path), os.getpid()))
+    fd_in = os.open(src_path, os.O_RDONLY)
+    try:
+        fd_out = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            _copy_data(fd_in, fd_out, src_stat.st_size)
+            os.fchmod(fd_out, src_stat.st_mode & 0o7777)
+        finally:
+            os.close(fd_out)
+        os.utime(tmp_path, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+        os.replace(tmp_path, dst_path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    finally:
+        os.close(fd_in)
+
+
+def _file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as hash_file:
+        for data in iter(lambda: hash_file.read(1 << 20), b''):
+            hasher.update(data)
+    return hasher.digest()
+
+
+def _is_unchanged(src_path, src_stat, dst_path, checksum):
+    """ Return True if dst_path already holds the same file as src_path:
+        same mode and size and either the same mtime or, with checksum, the
+        same content.
+    """
+    try:
+        dst_stat = os.stat(dst_path, follow_symlinks=False)
+    except OSError:
+        return False
+    if not stat.S_ISREG(dst_stat.st_mode) or dst_stat.st_size != src_stat.st_size \
+            or stat.S_IMODE(dst_stat.st_mode) != stat.S_IMODE(src_stat.st_mode):
+        return False
+    if checksum:
+        return _file_sha256(src_path) == _file_sha256(dst_path)
+    return dst_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+
+def _sync_link(src_path, dst_path):
+    """ Copy a symbolic link unless dst_path is already the same link.
+
+        Returns:
+            True if the link was copied
+    """
+    target = os.readlink(src_path)
+    try:
+        if os.readlink(dst_path) == target:
+            return False
+    except OSError:
+        pass
+    tmp_path = '{0}.{1}.sync'.format(dst_path, os.getpid())
+    os.symlink(target, tmp_path)
+    try:
+        os.replace(tmp_path, dst_path)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+    return True
+
+
+def sync_tree(src, dst, jobs=8, checksum=False, trace_flag=False):
+    """ Copy the directory tree src to dst skipping the files that are
+        already the same in dst.
+
+        A file is copied if dst has no file of the same mode, size and mtime
+        (or, with checksum, the same content).  Changed files are copied by a
+        pool of jobs threads using copy_file_range() or sendfile(), given
+        the mode and times of the source and moved into place so that a
+        partial copy is never seen.  Symbolic links are copied as links.
+        Directories get the mode and times of the source once their files
+        are copied.  Files in dst that are not in src are left alone, as
+        are sockets, fifos and devices in src.
+
+        Returns:
+            SyncResult(files seen, files copied, files skipped, bytes copied,
+            elapsed seconds, list of (path, error message))
+    """
+    start_time = time.monotonic()
+    src = absolute_path(src)
+    dst = absolute_path(dst)
+    counts = {'files': 0, 'copied': 0, 'skipped': 0, 'bytes': 0}
+    errors = []
+    lock = threading.Lock()
+    dirs = []
+
+    def copy(src_path, dst_path, src_stat):
+        try:
+            if _is_unchanged(src_path, src_stat, dst_path, checksum):
+                with lock:
+                    counts['skipped'] += 1
+                return
+            _copy_file(src_path, dst_path, src_stat)
+            with lock:
+                counts['copied'] += 1
+                counts['bytes'] += src_stat.st_size
+            if trace_flag:
+                print("\tCopied:", dst_path)
+        except Exception as excp:               # pylint: disable=broad-except
+            # The pool drops whatever a worker raises, so every failure is
+            # recorded here.
+            with lock:
+                errors.append((src_path, str(excp)))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as pool:
+        pending = [(src, dst)]
+        while pending:
+            src_dir, dst_dir = pending.pop()
+            try:
+                dir_stat = os.stat(src_dir)
+                # Not _make_dirs(): its cache outlives a dst that is removed
+                # between calls.
+                os.makedirs(dst_dir, exist_ok=True)
+                entries = list(os.scandir(src_dir))
+            except OSError as excp:
+                with lock:
+                    errors.append((src_dir, str(excp)))
+                continue
+            dirs.append((dst_dir, dir_stat))
+            for entry in entries:
+                dst_path = os.path.join(dst_dir, entry.name)
+                if entry.path == dst:
+                    continue                # dst is inside src
+                try:
+                    if entry.is_symlink():
+                        linked = _sync_link(entry.path, dst_path)
+                        with lock:
+                            counts['files'] += 1
+                            counts['copied' if linked else 'skipped'] += 1
+                    elif entry.is_dir():
+                        pending.append((entry.path, dst_path))
+                    elif entry.is_file():
+                        with lock:
+                            counts['files'] += 1
+                        pool.submit(copy, entry.path, dst_path, entry.stat())
+                except OSError as excp:
+                    with lock:
+                        errors.append((entry.path, str(excp)))
+
+    # Deepest directories first so setting a directory's times is not
+    # undone by a change inside it.
+    for dst_dir, dir_stat in reversed(dirs):
+        try:
+            os.chmod(dst_dir, dir_stat.st_mode & 0o7777)
+            os.utime(dst_dir, ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+        except OSError as excp:
+            errors.append((dst_dir, str(excp)))
+    return SyncResult(counts['files'], counts['copied'], counts['skipped'], counts['bytes'],
+                      time.monotonic() - start_time, errors)
+
+
+def sync_report(result):
+    """ Describe a SyncResult including the copy throughput.
+    """
+    elapsed = max(result.elapsed, 1e-9)
+    return "{0} files: {1} copied ({2:.1f} MB, {3:.1f} MB/s), {4} unchanged, " \
+           "{5} errors in {6:.2f}s ({7:.0f} files/s)".format(
+               result.files, result.copied, result.bytes / 1e6, result.bytes / 1e6 / elapsed,
+               result.skipped, len(result.errors), result.elapsed, result.files / elapsed)
+
+
 #---------------------------------------------------------------------
 #                       Command Class
 #---------------------------------------------------------------------
@@ -90,11 +447,65 @@ class Cmd:
         """
         raise NotImplementedError
 
+    def depends(self):
+        """ Names of the commands that must complete successfully before
+            this one is run.  Commands may override this method.
+        """
+        return []
+
+    def env_inputs(self):
+        """ Names of the environment variables that the command depends on.
+            Commands may override this method.
+        """
+        return []
+
+    def fingerprint(self, **kwargs):
+        """ Describe the command's inputs, environment variables, outputs
+            and arguments (other than the flags) as of now.  Files are
+            described by their mtime and size.  A missing output can never
+            be up to date.
+
+            Returns:
+                fingerprint string or None if the command declares no
+                inputs and no outputs
+        """
+        inputs = self.inputs()
+        outputs = self.outputs()
+        if not inputs and not outputs:
+            return None
+        files = {}
+        for pattern in inputs:
+            paths = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) \
+                    else [pattern]
+            for path in paths:
+                files[path] = _file_stamp(path)
+        for path in outputs:
+            stamp = _file_stamp(path)
+            if stamp is None:
+                return None
+            files[path] = stamp
+        env = {}
+        for name in self.env_inputs():
+            env[name] = os.getenv(name)
+        args = {}
+        for key, value in kwargs.items():
+            if not key.endswith('_flag'):
+                args[key] = value
+        data = json.dumps([files, env, args], sort_keys=True, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
     def help(self):
         """ Commands should override this method.
         """
         raise NotImplementedError
 
+    def inputs(self):
+        """ Files or glob patterns that the command reads.  Commands may
+            override this method so that they are skipped while their
+            inputs, environment variables and outputs do not change.
+        """
+        return []
+
     def name(self):
         """ Commands should override this method.
         """
@@ -105,22 +516,45 @@ class Cmd:
         """
         raise NotImplementedError
 
+    def outputs(self):
+        """ Files that the command creates.  Commands may override this
+            method.
+        """
+        return []
+
     def run(self, **kwargs):
         """ Run the cmd
         """
         return self.cmd(**kwargs)
 
 
+def _file_stamp(path):
+    """ Return [mtime_ns, size] of a file or None if it does not exist.
+    """
+    try:
+        file_stat = os.stat(path)
+    except OSError:
+        return None
+    return [file_stat.st_mtime_ns, file_stat.st_size]
+
+
 #---------------------------------------------------------------------
 #                       Commands Class
 #---------------------------------------------------------------------
 
 class Cmds:
     """ Commands Class
+
+        If state_path is given, the fingerprint of each command that declares
+        inputs or outputs is saved there after it succeeds, and the command
+        is skipped while its fingerprint does not change.  Pass
+        force_flag=True (normally MainBase's flg_force) to run it anyway.
     """
 
-    def __init__(self, *argv):
+    def __init__(self, *argv, state_path=None):
         self.cmd_dict = {}
+        self.state_path = state_path
+        self._state_lock = threading.Lock()
         for arg in argv:
             self.cmd_dict[arg.name()] = arg
 
@@ -139,34 +573,222 @@ class Cmds:
         """ Execute the given command.
         """
         if name in self.cmd_dict:
-            irc = self.cmd_dict[name].run(**kwargs)
+            irc = self._run_cmd(name, False, kwargs)
             return irc
         raise IndexError
 
-    def do_cmds(self, cmds, debug_flag=False, **kwargs):
+    def _run_cmd(self, name, debug_flag, kwargs):
+        """ Run a command unless it is up to date and record its fingerprint
+            when it succeeds.  Nothing is recorded for a dry run (exec_flag
+            is False).
+        """
+        cmd = self.cmd_dict[name]
+        record = self.state_path is not None and kwargs.get('exec_flag', True)
+        if record and not kwargs.get('force_flag', False):
+            fingerprint = cmd.fingerprint(**kwargs)
+            state = _read_json(self.state_path) or {}
+            if fingerprint is not None and state.get(name) == fingerprint:
+                if debug_flag:
+                    print("cmd:", name, "is up to date")
+                return 0
+        if debug_flag:
+            print("cmd:", name)
+        with tracer.span(name, 'cmd'):
+            irc = cmd.run(**kwargs) or 0
+        if record and irc <= 0:
+            fingerprint = cmd.fingerprint(**kwargs)
+            if fingerprint is not None:
+                self._save_fingerprint(name, fingerprint)
+        return irc
+
+    def _save_fingerprint(self, name, fingerprint):
+        """ Update the state file under a lock so that commands finishing
+            at the same time, in this or another process, do not lose each
+            other's fingerprints.
+        """
+        with self._state_lock:
+            with open(self.state_path + '.lock', 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                state = _read_json(self.state_path) or {}
+                state[name] = fingerprint
+                _write_json(self.state_path, state)
+
+    def do_cmds(self, cmds, debug_flag=False, jobs=1, **kwargs):
         """ Execute a group of commands
 
+            The commands that the given ones depend on are added, and each
+            command is run once after its dependencies.  With jobs=1 the
+            commands run one at a time in list order (dependencies first)
+            stopping at the first failure.  Otherwise up to jobs commands
+            that do not depend on each other run at the same time and only
+            the dependents of a failed command are cancelled.
+
         :param cmds:
             A non-empty list of command names and arguments
+        :param jobs:
+            maximum number of commands to run at the same time
+
+            Returns:
+                0, the return code of the first failed command in run order,
+                or 8 for an invalid command or a dependency cycle
         """
-        if len(cmds) > 0:
-            i = 0
-            while i < len(cmds):
-                if debug_flag:
-                    print("cmd:", cmds[i])
-                # By adjusting i, we can have commands with parameters.
-                if cmds[i] in self.cmd_dict:
-                    irc = self.cmd_dict[cmds[i]].run(**kwargs)
-                    if irc > 0:
-                        break
-                else:
-                    print("Error - Invalid Command - {}".format(cmds[i]))
-                    irc = 8
-                    break
-                i += 1
-        else:
+        if len(cmds) == 0:
             raise RuntimeError
-        return irc
+        try:
+            order, deps = self.cmd_order(cmds)
+        except ValueError as excp:
+            print("Error - {}".format(excp))
+            return 8
+        if jobs <= 1:
+            for name in order:
+                irc = self._run_cmd(name, debug_flag, kwargs)
+                if irc > 0:
+                    return irc
+            return 0
+        codes = self._run_graph(order, deps, jobs, debug_flag, kwargs)
+        for name in order:
+            if codes[name] is not None and codes[name] > 0:
+                return codes[name]
+        return 0
+
+    def parse_script(self, lines):
+        """ Parse a command script into a plan.  Each line holds a command
+            name followed by its arguments, split as the shell would.
+            Blank lines and '#' comments are ignored.  Every line is
+            checked against its command's num_args() (a negative number
+            allows any count, and a command without num_args() takes none).
+
+            Returns:
+                list of (line number, command name, list of arguments)
+            Raises:
+                ValueError listing every invalid line
+        """
+        plan = []
+        errors = []
+        for line_no, line in enumerate(lines, 1):
+            try:
+                words = shlex.split(line, comments=True)
+            except ValueError as excp:
+                errors.append("line {0}: {1}".format(line_no, excp))
+                continue
+            if not words:
+                continue
+            name, args = words[0], words[1:]
+            if name not in self.cmd_dict:
+                errors.append("line {0}: Invalid Command - {1}".format(line_no, name))
+                continue
+            try:
+                num_args = self.cmd_dict[name].num_args()
+            except NotImplementedError:
+                num_args = 0
+            if 0 <= num_args != len(args):
+                errors.append("line {0}: {1} takes {2} argument(s), not {3}".format(
+                    line_no, name, num_args, len(args)))
+                continue
+            plan.append((line_no, name, args))
+        if errors:
+            raise ValueError('\n'.join(errors))
+        return plan
+
+    def do_script(self, path, debug_flag=False, **kwargs):
+        """ Execute a command script in this process.  The whole script is
+            parsed and validated (see parse_script()) before any command
+            runs.  Each command is run with its arguments as args=[...] and
+            the script stops at the first failure.
+
+        :param path:
+            script file name or '-' for stdin
+
+            Returns:
+                0, the return code of the failed command, or 8 if the script
+                could not be read or is invalid
+        """
+        try:
+            if path == '-':
+                plan = self.parse_script(sys.stdin)
+            else:
+                with open(path) as script:
+                    plan = self.parse_script(script)
+        except OSError as excp:
+            print("Error - {}".format(excp))
+            return 8
+        except ValueError as excp:
+            print("Error - Invalid Script - {}\n{}".format(path, excp))
+            return 8
+        for line_no, name, args in plan:
+            if debug_flag:
+                print("line {0}:".format(line_no), cmd_str([name] + args))
+            irc = self._run_cmd(name, debug_flag, dict(kwargs, args=args))
+            if irc > 0:
+                return irc
+        return 0
+
+    def cmd_order(self, cmds):
+        """ Order the given commands and their dependencies so that every
+            command follows the ones that it depends on.
+
+            Returns:
+                (list of command names, dict of name to its dependencies)
+            Raises:
+                ValueError for an invalid command or a dependency cycle
+        """
+        order = []
+        deps = {}
+        visiting = set()
+
+        def visit(name, parent):
+            if name in deps:
+                return
+            if name not in self.cmd_dict:
+                if parent is None:
+                    raise ValueError("Invalid Command - {}".format(name))
+                raise ValueError("Invalid Command - {} (needed by {})".format(name, parent))
+            if name in visiting:
+                raise ValueError("Dependency Cycle - {}".format(name))
+            visiting.add(name)
+            for dep in self.cmd_dict[name].depends():
+                visit(dep, name)
+            visiting.discard(name)
+            deps[name] = list(self.cmd_dict[name].depends())
+            order.append(name)
+
+        for name in cmds:
+            visit(name, None)
+        return order, deps
+
+    def _run_graph(self, order, deps, jobs, debug_flag, kwargs):
+        """ Run the ordered commands on a pool of jobs worker threads
+
+            Returns:
+                dict of name to return code, None if it was cancelled
+        """
+        codes = {}
+        pending = list(order)
+        running = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+            while pending or running:
+                # pending is in dependency order, so one pass also cancels
+                # the dependents of a command that was just cancelled.
+                for name in list(pending):
+                    if len(running) >= jobs:
+                        break
+                    if any(dep not in codes for dep in deps[name]):
+                        continue
+                    pending.remove(name)
+                    if any(codes[dep] is None or codes[dep] > 0 for dep in deps[name]):
+                        codes[name] = None
+                        if debug_flag:
+                            print("cmd:", name, "cancelled")
+                        continue
+                    running[pool.submit(self._run_cmd, name, debug_flag, kwargs)] = name
+                if not running:
+                    continue
+                done, _ = concurrent.futures.wait(running,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    codes[running.pop(future)] = future.result()
+        return codes
 
     def cmd_desc(self):
         """ Build the description of the current commands in this object
@@ -180,6 +802,173 @@ class Cmds:
         return desc
 
 
+#---------------------------------------------------------------------
+#                       Docker Engine API
+#---------------------------------------------------------------------
+
+_UnixHTTPConnection = None
+
+def _unix_http_connection(socket_path, timeout=None):
+    """ Return an HTTP connection over a unix domain socket.  The class is
+        defined on first use since it needs http.client.
+    """
+    global _UnixHTTPConnection                  # pylint: disable=global-statement
+    if _UnixHTTPConnection is None:
+
+        class UnixHTTPConnection(http.client.HTTPConnection):
+            """ HTTP connection over a unix domain socket
+            """
+
+            def __init__(self, socket_path, timeout=None):
+                super().__init__('localhost', timeout=timeout)
+                self._socket_path = socket_path
+
+            def connect(self):
+                sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                if self.timeout is not None:
+                    sock.settimeout(self.timeout)
+                try:
+                    sock.connect(self._socket_path)
+                except OSError:
+                    sock.close()
+                    raise
+                self.sock = sock
+
+        _UnixHTTPConnection = UnixHTTPConnection
+    return _UnixHTTPConnection(socket_path, timeout)
+
+
+class DockerApi:
+    """ This object talks to the Docker Engine API over its unix socket
+        instead of starting the 'docker' cli for each operation.  The
+        connections are kept alive and reused between requests.
+
+        It can be given to DockerImage and DockerContainer as their backend.
+        Any error reaching the daemon is raised as OSError so that those
+        objects can fall back to the cli.  Building images still uses the
+        cli since the API needs the build context sent as a tar stream.
+    """
+
+    def __init__(self, socket_path='/var/run/docker.sock', timeout=None):
+        """ Set default parameters.
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def close(self):
+        """ Close all of the idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def request(self, method, path, query=None):
+        """ Issue one request to the Docker Engine.
+
+            Returns:
+                (HTTP status, response body bytes)
+            Raises:
+                OSError if the daemon could not be reached
+        """
+        url = path
+        if query:
+            url += '?' + urllib.parse.urlencode(query)
+        with tracer.span("{0} {1}".format(method, path), 'docker'):
+            return self._request(method, path, url)
+
+    def _request(self, method, path, url):
+        while True:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            if conn is None:
+                conn = _unix_http_connection(self.socket_path, self.timeout)
+            try:
+                conn.request(method, url, headers={'Host': 'docker'})
+                response = conn.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException) as excp:
+                conn.close()
+                if reused:
+                    # The daemon may have closed an idle connection.
+                    continue
+                raise OSError("docker api: {0} {1} failed: {2}".format(method, path, excp)) \
+                    from excp
+            if response.will_close:
+                conn.close()
+            else:
+                with self._lock:
+                    self._idle.append(conn)
+            return response.status, body
+
+    def images(self):
+        """ Get the Docker Image(s) Summary Data in the same form as
+            'docker image ls --format={{json .}}'.
+        """
+        status, body = self.request('GET', '/images/json')
+        if status != 200:
+            raise OSError("docker api: image list failed with status {0}".format(status))
+        images = []
+        for image in json.loads(body):
+            image_id = image.get('Id', '').split(':')[-1][:12]
+            created = time.strftime('%Y-%m-%d %H:%M:%S %z %Z',
+                                    time.localtime(image.get('Created', 0)))
+            for repo_tag in image.get('RepoTags') or ['<none>:<none>']:
+                repository, tag = split_image_name(repo_tag)
+                images.append({'Repository': repository, 'Tag': tag, 'ID': image_id,
+                               'CreatedAt': created, 'Size': str(image.get('Size', 0))})
+        return images
+
+    def image_pull(self, name, tag):
+        """ Pull an image.
+
+            Returns:
+                None or the error message from the daemon
+        """
+        status, body = self.request('POST', '/images/create', {'fromImage': name, 'tag': tag})
+        if status != 200:
+            return _docker_api_message(body) or "status {0}".format(status)
+        # The body is a stream of JSON progress messages.
+        for line in body.splitlines():
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(message, dict) and 'error' in message:
+                return message['error']
+        return None
+
+    def image_rm(self, image_name):
+        """ Remove an image forcibly.
+
+            Returns:
+                True if the image was removed
+        """
+        status, _ = self.request('DELETE', '/images/' + urllib.parse.quote(image_name, safe=''),
+                                 {'force': '1'})
+        return status == 200
+
+    def container_rm(self, name):
+        """ Kill and remove a container.
+
+            Returns:
+                True if the container was removed
+        """
+        status, _ = self.request('DELETE', '/containers/' + urllib.parse.quote(name, safe=''),
+                                 {'force': '1'})
+        return status in (200, 204)
+
+
+def _docker_api_message(body):
+    try:
+        return json.loads(body).get('message')
+    except (ValueError, AttributeError):
+        return None
+
+
 #---------------------------------------------------------------------
 #                           Docker Container
 #---------------------------------------------------------------------
@@ -191,9 +980,11 @@ class   DockerContainer:
         This object was written so that the user would not be required
         to install the python docker api.  Otherwise, we would have
         used it.
+        If a DockerApi backend is given, it is used instead of the cli
+        where possible.
     """
 
-    def __init__(self, name, tag=None):
+    def __init__(self, name, tag=None, backend=None):
         ''' Set default parameters.
         '''
         self._docker_name = name
@@ -201,6 +992,7 @@ class   DockerContainer:
             self._docker_tag = 'latest'
         else:
             self._docker_tag = tag
+        self._backend = backend
 
     def _image_name(self):
         image_name = self._docker_name
@@ -224,13 +1016,16 @@ class   DockerContainer:
             print("build(%s)" % name)
 
         # Perform the specified actions.
-        cmd_line = "docker image build --file %s -t %s %s" % (path, name, context)
+        cmd_line = ['docker', 'image', 'build', '--file', path, '-t', name, context]
         irc = 0                 # Assume that it works
 
         if debug_flag:
-            print("Debug:", cmd_line)
+            print("Debug:", cmd_str(cmd_line))
         else:
-            irc = do_cmd(cmd_line)
+            try:
+                irc = do_cmd(cmd_line)
+            finally:
+                docker_image_inventory.invalidate()
 
         return irc
 
@@ -245,10 +1040,13 @@ class   DockerContainer:
         irc = 0
         if image_name is None:
             pass
+        elif self._backend is not None and _docker_api_call(self._backend.container_rm,
+                                                            image_name) is not None:
+            pass
         else:
-            cmd_line = 'docker container rm -f {0}'.format(image_name)
+            cmd_line = ['docker', 'container', 'rm', '-f', image_name]
             if trace_flag:
-                print("Issuing:", cmd_line)
+                print("Issuing:", cmd_str(cmd_line))
             try:
                 irc = do_cmd(cmd_line)
             except OSError:
@@ -258,43 +1056,130 @@ class   DockerContainer:
 
     def run(self, force_flag=False, trace_flag=False):
         """ Run a Docker Container
+
+            The image is only pulled if it is not already present or if
+            force_flag is set.
+
+            Returns:
+                None or Error object
         """
-        image_name = self._image_name()
         self.kill()
 
-        dkr_img = DockerImage(self._docker_name, self._docker_tag)
-        image = dkr_img.find()
-        if image is None:
-            pass
-        else:
-            if force_flag:
-                pass
-            else:
-                return
+        dkr_img = DockerImage(self._docker_name, self._docker_tag, self._backend)
+        return dkr_img.pull(force_flag=force_flag, trace_flag=trace_flag)
 
-        # Get rid of any prior images if necessary
-        if image is None:
-            pass
-        else:
-            cmd_line = 'docker image rm -f {0}'.format(image_name)
-            if trace_flag:
-                print("Issuing: {0}".format(cmd_line))
+
+#---------------------------------------------------------------------
+#                       Docker Image Inventory
+#---------------------------------------------------------------------
+
+class DockerImageInventory:
+    """ This object caches the 'docker image ls' summary data indexed by
+        (repository, tag) so that looking up an image does not require
+        listing all of the images each time.
+
+        The listing is reloaded once it is older than 'ttl' seconds or after
+        invalidate() has been called.  If 'path' is given, the listing is
+        also kept in that file under an advisory lock so that several
+        scripts running at the same time share one listing.
+    """
+
+    def __init__(self, ttl=60.0, path=None, path_env=None):
+        """ Set default parameters.  path_env names an environment variable
+            holding the path, which is read each time it is needed.
+        """
+        self.ttl = ttl
+        self._path = path
+        self.path_env = path_env
+        self._images = None
+        self._index = {}
+        self._load_time = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        """ The file shared with other scripts or None.
+        """
+        if self._path is None and self.path_env:
+            return os.getenv(self.path_env) or None
+        return self._path
+
+    def _set(self, images, load_time):
+        self._images = images
+        self._load_time = load_time
+        self._index = {}
+        for image in images:
+            key = (image.get('Repository'), image.get('Tag'))
+            if key not in self._index:
+                self._index[key] = image
+
+    def _is_fresh(self, load_time):
+        return time.time() - load_time < self.ttl
+
+    def _load_shared(self, loader):
+        """ Load the listing from the shared file if it is still fresh,
+            otherwise list the images and update the file.  The file stays
+            locked while the images are listed so that other scripts wait
+            for this listing instead of starting their own.
+        """
+        with open(self.path, 'a+') as cache_file:
+            if fcntl is not None:
+                fcntl.flock(cache_file, fcntl.LOCK_EX)
             try:
-                do_cmd(cmd_line)
-            except OSError:
-                pass
+                cache_file.seek(0)
+                try:
+                    data = json.loads(cache_file.read())
+                    if self._is_fresh(data['time']):
+                        return data['images'], data['time']
+                except (ValueError, KeyError, TypeError):
+                    pass
+                images = loader() or []
+                load_time = time.time()
+                cache_file.seek(0)
+                cache_file.truncate()
+                json.dump({'time': load_time, 'images': images}, cache_file)
+                cache_file.flush()
+                return images, load_time
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(cache_file, fcntl.LOCK_UN)
+
+    def find(self, name, tag, loader):
+        """ Find the summary data of an image.
+
+            :param loader:
+                function returning the list of image summaries, used when
+                the cached listing is missing or too old
+            Returns:
+                image summary data or None if not found
+        """
+        with self._lock:
+            if self._images is None or not self._is_fresh(self._load_time):
+                if self.path is None:
+                    self._set(loader() or [], time.time())
+                else:
+                    self._set(*self._load_shared(loader))
+            return self._index.get((name, tag))
 
-        # Pull the image
-        dkr_img.pull()
-        cmd_line = "docker image pull {0} --format='{{json .}}'".format(image_name)
-        if trace_flag:
-            print("Issuing: {0}".format(cmd_line))
-        try:
-            do_cmd(cmd_line)
-        except OSError:
-            pass
+    def invalidate(self):
+        """ Throw away the cached listing.  This must be called after any
+            command that adds or removes images.
+        """
+        with self._lock:
+            self._images = None
+            self._index = {}
+            if self.path is not None and os.path.exists(self.path):
+                with open(self.path, 'a+') as cache_file:
+                    if fcntl is not None:
+                        fcntl.flock(cache_file, fcntl.LOCK_EX)
+                    cache_file.truncate(0)
+                    if fcntl is not None:
+                        fcntl.flock(cache_file, fcntl.LOCK_UN)
 
-        return
+
+# The image inventory shared by DockerImage and DockerContainer.  Set
+# DOCKER_IMAGE_CACHE to a file path to share the listing between scripts.
+docker_image_inventory = DockerImageInventory(path_env='DOCKER_IMAGE_CACHE')
 
 
 #---------------------------------------------------------------------
@@ -307,9 +1192,11 @@ class DockerImage:
         This object was written so that the user would not be required
         to install the python docker api.  Otherwise, we would have
         used it.
+        If a DockerApi backend is given, it is used instead of the cli
+        where possible.
     """
 
-    def __init__(self, name, tag=None):
+    def __init__(self, name, tag=None, backend=None):
         """ Set default parameters.
         """
         self._docker_name = name
@@ -317,6 +1204,7 @@ class DockerImage:
             self._docker_tag = 'latest'
         else:
             self._docker_tag = tag
+        self._backend = backend
 
     def _image_name(self):
         image_name = self._docker_name
@@ -337,116 +1225,591 @@ class DockerImage:
 
         image = self.find()
         if image is not None and not force_flag:
-            return Error("Error: image {0} already exists!".format(image_name))
+            return Error(8, "Error: image {0} already exists!".format(image_name))
 
         # Get rid of any prior images if necessary
-        if image is None:
+        removed = None
+        if image is not None and self._backend is not None:
+            removed = _docker_api_call(self._backend.image_rm, image_name)
+            if removed is not None:
+                docker_image_inventory.invalidate()
+            if removed is False:
+                return Error(8, "Error: could not remove image {0}".format(image_name))
+        if image is None or removed:
             pass
         else:
-            cmd_line = 'docker image rm -f {0}'.format(image_name)
+            cmd_line = ['docker', 'image', 'rm', '-f', image_name]
             if debug_flag:
-                print("\tDebug: {0}".format(cmd_line))
+                print("\tDebug: {0}".format(cmd_str(cmd_line)))
             try:
                 if trace_flag:
-                    print("\tIssuing: {0}".format(cmd_line))
+                    print("\tIssuing: {0}".format(cmd_str(cmd_line)))
                 irc = do_cmd(cmd_line)
                 if not irc == 0:
-                    return Error("Error: could not remove image {0}".format(image_name))
+                    return Error(8, "Error: could not remove image {0}".format(image_name))
             except OSError:
-                return Error("Error: could not remove image {0}".format(image_name))
+                return Error(8, "Error: could not remove image {0}".format(image_name))
+            finally:
+                docker_image_inventory.invalidate()
 
         # Pull the image
-        cmd_line = "docker image build -t {0} {1}".format(image_name, docker_file_path)
+        cmd_line = ['docker', 'image', 'build', '-t', image_name, docker_file_path]
         if debug_flag:
-            print("\tDebug: {0}".format(cmd_line))
+            print("\tDebug: {0}".format(cmd_str(cmd_line)))
         try:
             if trace_flag:
-                print("\tIssuing: {0}".format(cmd_line))
+                print("\tIssuing: {0}".format(cmd_str(cmd_line)))
             irc = do_cmd(cmd_line)
             if not irc == 0:
-                return Error("Error: could not build image {0}".format(image_name))
+                return Error(8, "Error: could not build image {0}".format(image_name))
         except OSError:
-            return Error("Error: could not build image {0}".format(image_name))
+            return Error(8, "Error: could not build image {0}".format(image_name))
+        finally:
+            docker_image_inventory.invalidate()
 
         return None
 
     def find(self):
-        """ Find information about a current Docker Image
+        """ Find information about a current Docker Image using the
+            cached image inventory.  If caching is turned off (ttl <= 0),
+            the listing is stopped as soon as the image is found.
         """
-        image_info = None
+        if docker_image_inventory.ttl > 0:
+            return docker_image_inventory.find(self._docker_name, self._docker_tag, self.images)
 
-        images = self.images()
-        if len(images) > 0:
+        images = self.iter_images()
+        try:
             for image in images:
-                if self._docker_name == image['Repository'] and self._docker_tag == image['Tag']:
-                    image_info = image
-
-        return image_info
+                if self._docker_name == image.get('Repository') \
+                        and self._docker_tag == image.get('Tag'):
+                    return image
+        finally:
+            images.close()
+        return None
 
-    def images(self, debug=False, trace=False):     #pylint: disable=no-self-use
+    def images(self, debug=False, trace=False):
         """ Get Docker Image(s) Summary Data
+
+            Returns:
+                list of image summary data (empty if there are no images)
         """
+        return list(self.iter_images(debug, trace))
 
-        cmd_line = "docker image ls --format='{{json .}}'"
-        if debug:
-            print("Issuing: {0}".format(cmd_line))
-        result = subprocess.getstatusoutput(cmd_line)
-        if trace:
-            print("\trc = %s, output = %s..." % (result[0], result[1]))
-        # irc = result[0]
-        output = result[1]
-        lines = output.splitlines(False)
-        input_array = '['
-        for line in lines:
-            input_array += line + ','
-        input_array = input_array[:-1] + ']'
+    def iter_images(self, debug=False, trace=False):    #pylint: disable=no-self-use
+        """ Generate the Docker Image(s) Summary Data one image at a time
+
+            The output of 'docker image ls' is read a line at a time and each
+            line is decoded as soon as it arrives.  Lines that are not JSON
+            objects, such as warnings written to stderr, are skipped.  If the
+            caller stops early, the 'docker' process is terminated.
+        """
 
-        json_images = None
-        if len(output) > 0:
-            json_images = json.loads(input_array)
+        if self._backend is not None:
+            images = _docker_api_call(self._backend.images)
+            if images is not None:
+                yield from images
+                return
 
-        return json_images
+        cmd_line = ['docker', 'image', 'ls', '--format', '{{json .}}']
+        if debug:
+            print("Issuing: {0}".format(cmd_str(cmd_line)))
+        with _cmd_span(cmd_line, '.'):
+            start = time.monotonic()
+            proc = subprocess.Popen(stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                    **_popen_args(cmd_line))
+            finished = False
+            try:
+                for line in proc.stdout:
+                    line = line.strip()
+                    image = None
+                    if line.startswith(b'{'):
+                        try:
+                            image = json.loads(line)
+                        except ValueError:
+                            pass
+                    if not isinstance(image, dict):
+                        if trace and line:
+                            print("\tSkipped: {0}".format(line.decode('utf-8', errors='replace')))
+                        continue
+                    yield image
+                finished = True
+            finally:
+                if not finished and proc.poll() is None:
+                    proc.terminate()
+                proc.stdout.close()
+                irc = _wait_child(proc, cmd_line, start)
+                if trace:
+                    print("\trc = {0}".format(irc))
 
     def pull(self, debug_flag=False, force_flag=False, trace_flag=False):
         """ Pull a Docker Image
+
+            Pulls of the same image requested at the same time by several
+            threads of this process share one 'docker image pull'.  An image
+            that is already in the inventory is not pulled again unless
+            force_flag is set.
+
+            Returns:
+                None or Error object
         """
+        return _docker_pulls.do(self._image_name(),
+                                lambda: self._pull(self.find(), debug_flag, force_flag,
+                                                   trace_flag))
 
-        image = self.find()
+    async def pull_async(self, debug_flag=False, force_flag=False, trace_flag=False):
+        """ Pull a Docker Image from a coroutine.  The pull runs in the
+            default executor so that it is shared with pulls of the same
+            image made by other coroutines or threads.
+
+            Returns:
+                None or Error object
+        """
+        import asyncio                      # pylint: disable=import-outside-toplevel
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.pull, debug_flag, force_flag, trace_flag)
+
+    @staticmethod
+    def pull_many(image_names, jobs=4, debug_flag=False, force_flag=False, trace_flag=False,
+                  progress=None, backend=None):
+        """ Pull several Docker Images using a pool of worker threads
+
+            The images are looked up in one image listing before any of them
+            are pulled, and only the missing ones (or all of them if
+            force_flag is set) are pulled.
+
+            :param image_names:
+                list of 'name:tag' strings or (name, tag) pairs.  The tag
+                defaults to 'latest'.
+            :param jobs:
+                maximum number of pulls running at the same time
+            :param progress:
+                function called as progress(image_name, err, elapsed) as each
+                image completes.  The default prints one line per image.
+            :param backend:
+                optional DockerApi to use instead of the cli
+
+            Returns:
+                None or an Error object naming every image that failed
+        """
+        if progress is None:
+            progress = _print_pull_progress(len(image_names))
+
+        images = []
+        for image_name in image_names:
+            if isinstance(image_name, str):
+                image_name = split_image_name(image_name)
+            images.append(DockerImage(*image_name, backend=backend))
+
+        def pull_one(dkr_img, image):
+            start_time = time.time()
+            if image is not None and not force_flag:
+                err = None
+            else:
+                err = _docker_pulls.do(dkr_img._image_name(),
+                                       lambda: dkr_img._pull(image, debug_flag, force_flag,
+                                                             trace_flag))
+            progress(dkr_img._image_name(), err, time.time() - start_time)
+            return err
+
+        failed = []
+        found = [dkr_img.find() for dkr_img in images]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            futures = [executor.submit(pull_one, dkr_img, image)
+                       for dkr_img, image in zip(images, found)]
+            for dkr_img, future in zip(images, futures):
+                try:
+                    err = future.result()
+                except Exception:                   # pylint: disable=broad-except
+                    err = Error(8, "Error: could not pull image {0}".format(dkr_img._image_name()))
+                if err is not None:
+                    failed.append(dkr_img._image_name())
+
+        if failed:
+            return Error(8, "Error: could not pull {0} image(s): {1}"
+                         .format(len(failed), ', '.join(failed)))
+        return None
+
+    def _pull(self, image, debug_flag, force_flag, trace_flag):
         if image is None:
             pass
         else:
             if force_flag:
                 pass
             else:
-                return
+                return None
 
         # Get rid of any prior images if necessary
         image_name = self._image_name()
         if image is None:
             pass
+        elif self._backend is not None and _docker_api_call(self._backend.image_rm,
+                                                            image_name) is not None:
+            docker_image_inventory.invalidate()
         else:
-            cmd_line = 'docker image rm -f {0}'.format(image_name)
+            cmd_line = ['docker', 'image', 'rm', '-f', image_name]
             if debug_flag:
-                print("\tDebug: {0}".format(cmd_line))
+                print("\tDebug: {0}".format(cmd_str(cmd_line)))
             try:
                 if trace_flag:
-                    print("\tIssuing: {0}".format(cmd_line))
+                    print("\tIssuing: {0}".format(cmd_str(cmd_line)))
                 do_cmd(cmd_line)
-            except OSError:
+            except (OSError, subprocess.CalledProcessError):
                 pass
+            docker_image_inventory.invalidate()
 
         # Pull the image
-        cmd_line = "docker image pull {0} --format='{{json .}}'".format(image_name)
+        if self._backend is not None:
+            if trace_flag:
+                print("\tIssuing: api pull {0}".format(image_name))
+            try:
+                msg = self._backend.image_pull(self._docker_name, self._docker_tag)
+            except OSError:
+                pass                        # Fall back to the cli.
+            else:
+                docker_image_inventory.invalidate()
+                if msg is None:
+                    return None
+                return Error(8, "Error: could not pull image {0}: {1}".format(image_name, msg))
+
+        cmd_line = ['docker', 'image', 'pull', image_name]
         if debug_flag:
-            print("\tDebug: {0}".format(cmd_line))
+            print("\tDebug: {0}".format(cmd_str(cmd_line)))
         try:
             if trace_flag:
-                print("\tIssuing: {0}".format(cmd_line))
+                print("\tIssuing: {0}".format(cmd_str(cmd_line)))
             do_cmd(cmd_line)
-        except OSError:
-            pass
+        except (OSError, subprocess.CalledProcessError):
+            return Error(8, "Error: could not pull image {0}".format(image_name))
+        finally:
+            docker_image_inventory.invalidate()
 
-        return
+        return None
+
+
+def _docker_api_call(func, *args):
+    """ Call a DockerApi method returning None if the daemon could not be
+        reached so that the caller falls back to the cli.
+    """
+    try:
+        return func(*args)
+    except OSError:
+        return None
+
+
+#---------------------------------------------------------------------
+#   split_image_name -- Split a Docker Image name into name and tag
+#---------------------------------------------------------------------
+
+def split_image_name(image_name):
+    """ Split 'name:tag' into (name, tag) allowing for a registry port
+        in the name such as 'localhost:5000/app'.
+    """
+    name, sep, tag = image_name.rpartition(':')
+    if not sep or '/' in tag:
+        return image_name, 'latest'
+    return name, tag
+
+
+def _print_pull_progress(total):
+    lock = threading.Lock()
+    count = [0]
+
+    def progress(image_name, err, elapsed):
+        with lock:
+            count[0] += 1
+            status = 'ok' if err is None else 'FAILED'
+            print("[{0}/{1}] {2} {3} {4:.1f}s".format(count[0], total, image_name, status,
+                                                     elapsed), flush=True)
+    return progress
+
+
+#---------------------------------------------------------------------
+#                       Single Flight Class
+#---------------------------------------------------------------------
+
+class SingleFlight:
+    """ This object makes certain that a function is only running once at
+        a time for a given key.  Callers that arrive while the function is
+        running for their key wait for it and get the same result.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        """ Call func() unless a call for key is already in flight, in which
+            case wait for that call and return its result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {'done': threading.Event(), 'result': None, 'excp': None}
+                self._calls[key] = call
+        if leader:
+            try:
+                call['result'] = func()
+            except BaseException as excp:
+                call['excp'] = excp
+                raise
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['done'].set()
+            return call['result']
+
+        call['done'].wait()
+        if call['excp'] is not None:
+            raise call['excp']
+        return call['result']
+
+
+# The image pulls that are in progress in this process.
+_docker_pulls = SingleFlight()
+
+
+#---------------------------------------------------------------------
+#                           Tracer Class
+#---------------------------------------------------------------------
+
+class _NullSpan:
+    """ Span used while tracing is off.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+class _Span:
+    """ One timed phase of a Tracer.
+    """
+
+    def __init__(self, tracer, name, cat, args, async_id):
+        self.tracer = tracer
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.async_id = async_id
+        self.start_ns = 0
+
+    def __enter__(self):
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        args = self.args
+        if exc_type is not None:
+            args = dict(args or {}, error=exc_type.__name__)
+        self.tracer.add(self.name, self.cat, self.start_ns, time.perf_counter_ns(), args,
+                        self.async_id)
+        return False
+
+
+class Tracer:
+    """ This object records timed phases (spans) of a program and writes
+        them as a Chrome trace event file that chrome://tracing and
+        https://ui.perfetto.dev can display.  Each span is shown on the
+        thread that ran it so concurrent work can be seen side by side.
+        Spans of coroutines, which overlap on one thread, are recorded as
+        async events instead.
+
+        Tracing is off until start() is called, and a span then costs
+        almost nothing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._events = []
+        self._threads = {}
+        self._start_ns = 0
+        self._async_ids = 0
+        self._lock = threading.Lock()
+
+    def start(self, start_ns=None):
+        """ Start recording spans.  Times are relative to start_ns, a
+            time.perf_counter_ns() value that defaults to now.
+        """
+        with self._lock:
+            self._events = []
+            self._threads = {}
+            self._start_ns = time.perf_counter_ns() if start_ns is None else start_ns
+            self.enabled = True
+
+    def stop(self):
+        """ Stop recording spans.
+        """
+        self.enabled = False
+
+    def span(self, name, cat='', args=None, overlaps=False):
+        """ Return a context manager timing the code that it wraps.
+
+            :param overlaps:
+                set for a span that runs in a coroutine so it is recorded as
+                an async event
+        """
+        if not self.enabled:
+            return _null_span
+        async_id = None
+        if overlaps:
+            with self._lock:
+                self._async_ids += 1
+                async_id = self._async_ids
+        return _Span(self, name, cat, args, async_id)
+
+    def add(self, name, cat, start_ns, end_ns, args=None, async_id=None):
+        """ Record a span that ran from start_ns to end_ns on this thread.
+        """
+        if not self.enabled:
+            return
+        tid = threading.get_native_id()
+        event = {'name': name, 'cat': cat or 'util', 'pid': os.getpid(), 'tid': tid,
+                 'ts': (start_ns - self._start_ns) / 1000.0}
+        if args:
+            event['args'] = args
+        with self._lock:
+            if tid not in self._threads:
+                self._threads[tid] = threading.current_thread().name
+            if async_id is None:
+                event['ph'] = 'X'
+                event['dur'] = (end_ns - start_ns) / 1000.0
+                self._events.append(event)
+            else:
+                event.update(ph='b', id=async_id)
+                self._events.append(event)
+                self._events.append(dict(event, ph='e', ts=(end_ns - self._start_ns) / 1000.0))
+
+    def events(self):
+        """ Return the trace events recorded so far including the thread
+            names.
+        """
+        with self._lock:
+            events = list(self._events)
+            threads = dict(self._threads)
+        for tid, name in sorted(threads.items()):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                           'args': {'name': name}})
+        return events
+
+    def save(self, path):
+        """ Write the trace event file.
+        """
+        with open(path, 'w') as trace_file:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms'}, trace_file)
+
+
+# The tracer of this process, started by MainBase's --profile option.
+tracer = Tracer()
+
+
+def traced(cat):
+    """ Decorator recording each call of a function as a span named after
+        the function and its string arguments.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            names = [arg for arg in args if isinstance(arg, str)]
+            with tracer.span(' '.join([func.__name__] + names), cat):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _cmd_span(cmd_line, cwd):
+    """ Return the span of one O/S command.
+    """
+    if not tracer.enabled:
+        return _null_span
+    return tracer.span(cmd_str(cmd_line), 'subprocess', {'cwd': cwd or '.'})
+
+
+#---------------------------------------------------------------------
+#                       Child Stats Class
+#---------------------------------------------------------------------
+
+class ChildStats:
+    """ This object collects the resources used by each child process
+        that do_cmd(), do_sys() and do_sys_iter() run: wall time, user and
+        system CPU time and maximum resident set size.  The usage is taken
+        from os.wait4() so it belongs to that one child even while other
+        commands run at the same time.
+
+        Nothing is collected until start() is called.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._records = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        """ Start collecting.
+        """
+        with self._lock:
+            self._records = []
+            self.enabled = True
+
+    def add(self, cmd_line, returncode, wall, usage):
+        """ Record one finished child.  usage is the resource.struct_rusage
+            from os.wait4() or None if it is not available.
+        """
+        if not self.enabled:
+            return
+        record = {'cmd': cmd_str(cmd_line), 'rc': returncode, 'wall': round(wall, 6),
+                  'user': None, 'sys': None, 'maxrss_kb': None}
+        if usage is not None:
+            record['user'] = round(usage.ru_utime, 6)
+            record['sys'] = round(usage.ru_stime, 6)
+            # Linux reports ru_maxrss in kilobytes, macOS in bytes.
+            record['maxrss_kb'] = usage.ru_maxrss // 1024 if sys.platform == 'darwin' \
+                                  else usage.ru_maxrss
+        with self._lock:
+            self._records.append(record)
+
+    def records(self):
+        """ Return the records sorted by CPU time (user + system), largest
+            first.
+        """
+        with self._lock:
+            records = list(self._records)
+        return sorted(records, key=lambda r: -((r['user'] or 0.0) + (r['sys'] or 0.0)))
+
+    def report(self, fmt='table'):
+        """ Return the records as a 'table' or a 'json' document.
+        """
+        records = self.records()
+        total = {'count': len(records)}
+        for key in ('wall', 'user', 'sys'):
+            total[key] = round(sum(r[key] or 0.0 for r in records), 6)
+        total['maxrss_kb'] = max([r['maxrss_kb'] or 0 for r in records] or [0])
+        if fmt == 'json':
+            return json.dumps({'children': records, 'total': total}, indent=1)
+
+        def num(value, spec):
+            return '-' if value is None else format(value, spec)
+
+        lines = ["{0:>9} {1:>9} {2:>9} {3:>10} {4:>4}  {5}".format(
+            'wall(s)', 'user(s)', 'sys(s)', 'maxrss(KB)', 'rc', 'command')]
+        for record in records + [dict(total, cmd='total', rc=None)]:
+            lines.append("{0:>9} {1:>9} {2:>9} {3:>10} {4:>4}  {5}".format(
+                num(record['wall'], '.3f'), num(record['user'], '.3f'),
+                num(record['sys'], '.3f'), num(record['maxrss_kb'], 'd'),
+                num(record['rc'], 'd'), record['cmd']))
+        return '\n'.join(lines)
+
+
+# The child process statistics of this process, started by MainBase's
+# --stats option.
+child_stats = ChildStats()
 
 
 #---------------------------------------------------------------------
@@ -484,44 +1847,541 @@ class Error:
 #                           OS Execute
 #---------------------------------------------------------------------
 
-def do_cmd(cmd_line, cwd='.'):
+def _cmd_env(env):
+    """ Merge the given environment variables into the current ones.
+    """
+    if env is None:
+        return None
+    cmd_env = dict(os.environ)
+    cmd_env.update(env)
+    return cmd_env
+
+
+_which_cache = {}
+
+def _which(program, env):
+    path = (env or os.environ).get('PATH', os.defpath)
+    key = (program, path)
+    if key not in _which_cache:
+        _which_cache[key] = shutil.which(program, path=path) or program
+    return _which_cache[key]
+
+
+def _popen_args(cmd_line, cwd='.', env=None):
+    """ Build the subprocess arguments for a command line.
+
+        A string is run by the shell.  A list or tuple is an argv that is
+        executed directly without starting a shell.  Its program is looked
+        up on PATH once and then given by full path, file descriptors are
+        left alone (Python creates them non-inheritable) and the working
+        directory is only passed if it is not '.'.  That lets subprocess use
+        posix_spawn() instead of fork() and exec().
+    """
+    cmd_env = _cmd_env(env)
+    if isinstance(cmd_line, str):
+        return {'args': cmd_line, 'cwd': cwd, 'shell': True, 'env': cmd_env}
+    argv = list(cmd_line)
+    if os.path.dirname(argv[0]) == '':
+        argv[0] = _which(argv[0], cmd_env)
+    if cwd in (None, '', '.'):
+        cwd = None
+    return {'args': argv, 'cwd': cwd, 'close_fds': False, 'env': cmd_env}
+
+
+def cmd_str(cmd_line):
+    """ Return a command line, either a string or an argv list, as a
+        string suitable for messages.
+    """
+    if isinstance(cmd_line, str):
+        return cmd_line
+    return shlex.join(cmd_line)
+
+
+def _wait_child(proc, cmd_line, start, timeout=None):
+    """ Wait for a child started at start (time.monotonic()) to exit and
+        record its resource usage in child_stats.
+
+        Returns:
+            return code
+        Raises:
+            subprocess.TimeoutExpired if it is still running after timeout
+            seconds
+    """
+    if not hasattr(os, 'wait4'):
+        irc = proc.wait(timeout)
+        child_stats.add(cmd_line, irc, time.monotonic() - start, None)
+        return irc
+    deadline = None if timeout is None else time.monotonic() + timeout
+    delay = 0.0005
+    while True:
+        try:
+            pid, status, usage = os.wait4(proc.pid, 0 if deadline is None else os.WNOHANG)
+        except ChildProcessError:
+            # Already reaped, for instance by proc.poll().
+            irc = proc.wait()
+            child_stats.add(cmd_line, irc, time.monotonic() - start, None)
+            return irc
+        if pid != 0:
+            break
+        if time.monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(cmd_line, timeout)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    child_stats.add(cmd_line, proc.returncode, time.monotonic() - start, usage)
+    return proc.returncode
+
+
+def _communicate(proc):
+    """ Read all of stdout and stderr of a child without waiting for it.
+
+        Returns:
+            (stdout bytes, stderr bytes)
+    """
+    output = {proc.stdout: [], proc.stderr: []}
+    with selectors.DefaultSelector() as selector:
+        for pipe in output:
+            selector.register(pipe, selectors.EVENT_READ)
+        while selector.get_map():
+            for key, _ in selector.select():
+                data = os.read(key.fd, 65536)
+                if data:
+                    output[key.fileobj].append(data)
+                else:
+                    selector.unregister(key.fileobj)
+                    key.fileobj.close()
+    return b''.join(output[proc.stdout]), b''.join(output[proc.stderr])
+
+
+def do_cmd(cmd_line, cwd='.', env=None):
     """ Execute an O/S command without capturing input or output.
 
+        :param cmd_line:
+            command line string run by the shell or an argv list executed
+            directly
+        :param env:
+            optional dictionary of environment variables to add to the
+            current environment for the command
+
         Returns:
             command return code
     """
-    result = subprocess.run(cmd_line, cwd=cwd, shell=True, check=True)
-    return result.returncode
-
-def do_sys(cmd_line, cwd='.'):
+    with _cmd_span(cmd_line, cwd):
+        start = time.monotonic()
+        with subprocess.Popen(**_popen_args(cmd_line, cwd, env)) as proc:
+            try:
+                irc = _wait_child(proc, cmd_line, start)
+            except BaseException:
+                proc.kill()
+                raise
+    if irc != 0:
+        raise subprocess.CalledProcessError(irc, cmd_line)
+    return irc
+
+def do_sys(cmd_line, cwd='.', env=None):
     """ Execute an O/S command capturing both, stdout and stderr.
+        cmd_line is either a string run by the shell or an argv list.
 
         Returns:
             result.returncode
             result.stdout
             result.stderr
     """
-    result = subprocess.run(cmd_line, cwd=cwd, stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE, shell=True, check=True)
-    return result
+    with _cmd_span(cmd_line, cwd):
+        start = time.monotonic()
+        with subprocess.Popen(stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                              **_popen_args(cmd_line, cwd, env)) as proc:
+            try:
+                stdout, stderr = _communicate(proc)
+                irc = _wait_child(proc, cmd_line, start)
+            except BaseException:
+                proc.kill()
+                raise
+    if irc != 0:
+        raise subprocess.CalledProcessError(irc, cmd_line, stdout, stderr)
+    return subprocess.CompletedProcess(cmd_line, irc, stdout, stderr)
+
+
+def do_sys_iter(cmd_line, cwd='.', env=None, keep=100, callback=None, timeout=None):
+    """ Execute an O/S command generating its output a line at a time as
+        it arrives on stdout or stderr.
+
+        Both pipes are read as data becomes available so the command can
+        not block on a full pipe, and only the last 'keep' lines are kept
+        for error reports no matter how much output there is.  If the
+        caller stops early, the command is killed.
+
+        :param callback:
+            optional function called as callback(stream, line) for each line
+        :param timeout:
+            optional number of seconds after which the command is killed
+
+        Yields:
+            (stream, line) where stream is 'stdout' or 'stderr' and line is
+            the decoded text without its line ending
+        Raises:
+            subprocess.CalledProcessError for a non-zero return code with the
+            last lines of stdout and stderr as its output and stderr
+            subprocess.TimeoutExpired if the command ran too long
+    """
+    with _cmd_span(cmd_line, cwd):
+        start = time.monotonic()
+        proc = subprocess.Popen(stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                **_popen_args(cmd_line, cwd, env))
+        tail = collections.deque(maxlen=keep)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        selector = selectors.DefaultSelector()
+        decoders = {}
+        partial = {}
+        for stream, pipe in (('stdout', proc.stdout), ('stderr', proc.stderr)):
+            selector.register(pipe, selectors.EVENT_READ, stream)
+            decoders[stream] = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            partial[stream] = ''
+
+        def tail_text(stream):
+            return '\n'.join(line for line_stream, line in tail if line_stream == stream)
+
+        try:
+            while selector.get_map():
+                wait = None
+                if deadline is not None:
+                    wait = deadline - time.monotonic()
+                    if wait <= 0:
+                        raise subprocess.TimeoutExpired(cmd_line, timeout,
+                                                        output=tail_text('stdout'),
+                                                        stderr=tail_text('stderr'))
+                for key, _ in selector.select(wait):
+                    stream = key.data
+                    data = os.read(key.fd, 65536)
+                    if data:
+                        lines = (partial[stream] + decoders[stream].decode(data)).split('\n')
+                        partial[stream] = lines.pop()
+                    else:
+                        selector.unregister(key.fileobj)
+                        rest = partial[stream] + decoders[stream].decode(b'', final=True)
+                        lines = [rest] if rest else []
+                    for line in lines:
+                        line = line.rstrip('\r')
+                        tail.append((stream, line))
+                        if callback is not None:
+                            callback(stream, line)
+                        yield stream, line
+
+            wait = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                irc = _wait_child(proc, cmd_line, start, wait)
+            except subprocess.TimeoutExpired:
+                raise subprocess.TimeoutExpired(cmd_line, timeout, output=tail_text('stdout'),
+                                                stderr=tail_text('stderr')) from None
+            if irc != 0:
+                raise subprocess.CalledProcessError(irc, cmd_line, output=tail_text('stdout'),
+                                                    stderr=tail_text('stderr'))
+        finally:
+            selector.close()
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+            proc.stderr.close()
+
+
+_print_lock = threading.Lock()
+
+def do_cmd_prefixed(cmd_line, prefix, cwd='.', env=None):
+    """ Execute an O/S command printing each line of its output (stdout
+        and stderr) with the given prefix as soon as it arrives.  Lines
+        from commands running at the same time are not mixed.
+
+        Returns:
+            command return code
+    """
+    def show(_, line):
+        with _print_lock:
+            print("{0}{1}".format(prefix, line), flush=True)
+
+    try:
+        for _ in do_sys_iter(cmd_line, cwd, env, keep=0, callback=show):
+            pass
+    except subprocess.CalledProcessError as excp:
+        return excp.returncode
+    return 0
+
+
+#---------------------------------------------------------------------
+#                       Async Runner Class
+#---------------------------------------------------------------------
+
+class AsyncRunner:
+    """ Run O/S commands from coroutines with at most max_concurrency of
+        them running at once.
+
+        A command that times out or whose coroutine is cancelled (as
+        asyncio.run() does on Ctrl-C) has its process terminated, and
+        killed if it does not exit within grace seconds.
+    """
+
+    def __init__(self, max_concurrency=4, timeout=None, grace=2.0):
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.timeout = timeout
+        self.grace = grace
+        self._semaphore = None
+        self._procs = set()
+
+    async def run(self, cmd_line, cwd='.', env=None, timeout=None, check=True):
+        """ Execute an O/S command capturing its output (stdout and stderr)
+
+            :param timeout:
+                seconds before the command is stopped, defaults to the
+                runner's timeout
+            :param check:
+                raise CalledProcessError for a non-zero return code
+
+            Returns:
+                subprocess.CompletedProcess
+            Raises:
+                subprocess.CalledProcessError, subprocess.TimeoutExpired or
+                OSError if the command could not be started
+        """
+        import asyncio                      # pylint: disable=import-outside-toplevel
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        if timeout is None:
+            timeout = self.timeout
+        args = _popen_args(cmd_line, cwd, env)
+        cmd_args = args.pop('args')
+        async with self._semaphore:
+            with tracer.span(cmd_str(cmd_line), 'async', overlaps=True):
+                if args.pop('shell', False):
+                    proc = await asyncio.create_subprocess_shell(
+                        cmd_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **args)
+                else:
+                    proc = await asyncio.create_subprocess_exec(
+                        *cmd_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **args)
+                self._procs.add(proc)
+                try:
+                    stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout)
+                except asyncio.TimeoutError:
+                    await self._stop(proc)
+                    raise subprocess.TimeoutExpired(cmd_line, timeout) from None
+                except asyncio.CancelledError:
+                    await self._stop(proc)
+                    raise
+                finally:
+                    self._procs.discard(proc)
+        if check and proc.returncode != 0:
+            raise subprocess.CalledProcessError(proc.returncode, cmd_line, stdout, stderr)
+        return subprocess.CompletedProcess(cmd_line, proc.returncode, stdout, stderr)
+
+    async def run_many(self, cmd_lines, cwd='.', env=None, timeout=None, check=True):
+        """ Execute several O/S commands concurrently
+
+            Returns:
+                list in cmd_lines order of either subprocess.CompletedProcess
+                or the exception raised for that command
+        """
+        import asyncio                      # pylint: disable=import-outside-toplevel
+        return await asyncio.gather(*(self.run(cmd_line, cwd, env, timeout, check)
+                                      for cmd_line in cmd_lines),
+                                    return_exceptions=True)
+
+    async def terminate_all(self):
+        """ Stop every command that is still running
+        """
+        import asyncio                      # pylint: disable=import-outside-toplevel
+        await asyncio.gather(*(self._stop(proc) for proc in list(self._procs)))
+
+    async def _stop(self, proc):
+        import asyncio                      # pylint: disable=import-outside-toplevel
+        if proc.returncode is not None:
+            return
+        try:
+            proc.terminate()
+            await asyncio.wait_for(proc.wait(), self.grace)
+        except ProcessLookupError:
+            pass
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
 
 
 #---------------------------------------------------------------------
 #           go_build -- Build a Golang Application
 #---------------------------------------------------------------------
 
-def go_build_app(app_dir, app_name, debug=False, trace=False): # pylint: disable=too-many-branches
+_go_version_cache = {}
+
+def go_version():
+    """ Return the 'go version' output of the go toolchain found on PATH.
+        The result is remembered for each PATH setting.
+    """
+    path = os.getenv('PATH', '')
+    if path not in _go_version_cache:
+        try:
+            version = do_sys(['go', 'version']).stdout.decode('utf-8', errors='replace').strip()
+        except (OSError, subprocess.CalledProcessError):
+            version = ''
+        _go_version_cache[path] = version
+    return _go_version_cache[path]
+
+
+def _go_source_state(src_files, index):
+    """ Describe the source files by mtime, size and content hash.  A file
+        is only read and hashed if its mtime or size differ from the entry
+        in index (a previous result of this function).
+    """
+    state = {}
+    for src_file in src_files:
+        file_stat = os.stat(src_file)
+        entry = index.get(src_file)
+        if entry is None or entry.get('mtime_ns') != file_stat.st_mtime_ns \
+                or entry.get('size') != file_stat.st_size:
+            with open(src_file, 'rb') as src:
+                entry = {'mtime_ns': file_stat.st_mtime_ns, 'size': file_stat.st_size,
+                         'sha256': hashlib.sha256(src.read()).hexdigest()}
+        state[src_file] = entry
+    return state
+
+
+def _go_dep_files(app_dir_abs, src_files, env=None):
+    """ Return the go.mod and go.sum of the module holding the application
+        and the go source files of the local packages that it imports.
+
+        Returns:
+            list of file paths or None if 'go list' failed
+    """
+    mod_dir = app_dir_abs
+    while not os.path.exists(os.path.join(mod_dir, 'go.mod')):
+        parent = os.path.dirname(mod_dir)
+        if parent == mod_dir:
+            mod_dir = None
+            break
+        mod_dir = parent
+    dep_files = []
+    if mod_dir:
+        for name in ('go.mod', 'go.sum'):
+            if os.path.isfile(os.path.join(mod_dir, name)):
+                dep_files.append(os.path.join(mod_dir, name))
+    cmd_line = ['go', 'list', '-deps', '-f', '{{if not .Standard}}{{.Dir}}{{end}}'] + src_files
+    try:
+        result = do_sys(cmd_line, env=env)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    app_real = os.path.realpath(app_dir_abs)
+    for dep_dir in sorted(set(result.stdout.decode('utf-8', errors='replace').splitlines())):
+        # Packages from the module cache are covered by go.sum.
+        if not dep_dir or os.path.realpath(dep_dir) == app_real \
+                or (mod_dir and not os.path.realpath(dep_dir).startswith(
+                    os.path.realpath(mod_dir) + os.sep)):
+            continue
+        dep_files.extend(sorted(glob.glob(os.path.join(dep_dir, '*.go'))))
+    return dep_files
+
+
+def _go_build_manifest(src_state, cmd_line):
+    """ Build the manifest describing one build of an application.
+    """
+    hasher = hashlib.sha256()
+    for src_file in sorted(src_state):
+        hasher.update(src_file.encode('utf-8') + b'\0')
+        hasher.update(src_state[src_file]['sha256'].encode('ascii'))
+    env = {}
+    for name in ('CGO_ENABLED', 'GOARCH', 'GOFLAGS', 'GOOS'):
+        env[name] = os.getenv(name)
+    return {'sources': hasher.hexdigest(), 'go_version': go_version(),
+            'flags': cmd_line, 'env': env}
+
+
+def _go_fmt_changed(src_files, index_path, debug=False, trace=False, force=False, prefix=None):
+    """ Reformat only the source files that changed since the last
+        successful reformat recorded in index_path and report the result
+        for each file.
+
+        Returns:
+            (Error object or None, source state after reformatting)
+    """
+    prefix = prefix or '\t'
+    index = _read_json(index_path) or {}
+    state = _go_source_state(src_files, index)
+    changed = [src_file for src_file in src_files
+               if force or index.get(src_file, {}).get('sha256') != state[src_file]['sha256']]
+    if trace:
+        for src_file in src_files:
+            if src_file not in changed:
+                print("{0}go fmt: {1} unchanged, skipped".format(prefix, src_file))
+    if not changed:
+        return None, state
+
+    cmd_line = ['go', 'fmt'] + changed
+    if trace:
+        print("Issuing: {0}".format(cmd_str(cmd_line)))
+    if debug:
+        print("\t Debug: {0}".format(cmd_str(cmd_line)))
+        return None, state
+    try:
+        result = do_sys(cmd_line)
+    except subprocess.CalledProcessError as excp:
+        for line in (excp.stderr or b'').decode('utf-8', errors='replace').splitlines():
+            print("{0}{1}".format(prefix, line))
+        return Error(8, "Error: '%s' failed!" % cmd_str(cmd_line)), state
+
+    # 'go fmt' lists the files that it rewrote.
+    rewritten = set(result.stdout.decode('utf-8', errors='replace').split())
+    for src_file in changed:
+        rewritten_flag = src_file in rewritten or os.path.relpath(src_file) in rewritten
+        if rewritten_flag or trace:
+            print("{0}go fmt: {1} {2}".format(prefix, src_file,
+                                             'reformatted' if rewritten_flag else 'ok'))
+    state = _go_source_state(src_files, state)
+    os.makedirs(os.path.dirname(index_path), 0o777, exist_ok=True)
+    _write_json(index_path, state)
+    return None, state
+
+
+def _read_json(path):
+    try:
+        with open(path) as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    """ Write a JSON file atomically so that readers never see half of it.
+    """
+    tmp_path = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'w') as json_file:
+        json.dump(data, json_file, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+@traced('go')
+def go_build_app(app_dir, app_name, debug=False, trace=False, force=False, # pylint: disable=too-many-branches
+                 prefix=None, mirror=None):
     """ Build a golang application including reformatting the source
 
     This builds go packages located in the 'cmd'/szAppName directory.
     The built program can be found at $TMP/bin/szAppName.
 
+    A manifest of the build (content hash of the sources, go version and
+    build flags) is kept in $TMP/bin/.szAppName.manifest.json.  The sources
+    include go.mod, go.sum and the local packages that 'go list -deps'
+    reports.  If it still matches and the program exists, reformatting and
+    building are skipped.
+    Only the source files that changed since they were last reformatted
+    are given to 'go fmt'.  The mtime, size and hash of each file are kept
+    in $TMP/bin/.szAppName.fmt.json.
+
     Args:
         app_dir (str): Application Directory where 'main.go' can be
                         found.
         app_name (str): Application Name
         debug (bool):   True == dont execute commands
         trace (bool):   True == trace actions
+        force (bool):   True == build even if the manifest matches
+        prefix (str):   if given, the output of each command is printed a
+                        line at a time starting with this prefix
+        mirror (GoModMirror): module mirror to build from, default is the
+                        one named by $GO_MOD_MIRROR if any
 
     Returns:
         Error object or None for successful completion
@@ -538,71 +2398,239 @@ def go_build_app(app_dir, app_name, debug=False, trace=False): # pylint: disable
     tmp_dir = tmp_dir or os.getenv('TMP')
     tmp_dir = tmp_dir or os.getenv('TEMP')
     if tmp_dir is None:
-        return Error("Error: Can't find temporary Directory, TMP or TEMP, in environment!")
+        return Error(8, "Error: Can't find temporary Directory, TMP or TEMP, in environment!")
     app_dir_abs = absolute_path(os.path.join(cur_dir, app_dir, app_name))
     if trace:
         print("\ttmp_dir:", tmp_dir)
         print("\tapp_dir_abs:", app_dir_abs)
 
-    # Reformat the source code.
-    err = None
+    # Skip everything if nothing has changed since the last build.
+    src_glob = os.path.join(cur_dir, app_dir, app_name, '*.go')
+    src_files = sorted(glob.glob(src_glob))
+    if not src_files:
+        return Error(8, "Error: no go source files found in {0}!".format(app_dir_abs))
+    app_path = os.path.join(tmp_dir, 'bin', app_name)
+    manifest_path = os.path.join(tmp_dir, 'bin', '.{0}.manifest.json'.format(app_name))
+    fmt_index_path = os.path.join(tmp_dir, 'bin', '.{0}.fmt.json'.format(app_name))
+    build_argv = ['go', 'build', '-o', app_path, '-v'] + src_files
+    build_line = cmd_str(build_argv)
+    mirror = mirror or GoModMirror.default()
+    build_env = mirror.env() if mirror else None
+    dep_state = None
+    if not debug:
+        dep_files = _go_dep_files(app_dir_abs, src_files, build_env)
+        try:
+            dep_state = _go_source_state(dep_files, {}) if dep_files is not None else None
+        except OSError:
+            dep_state = None
+    if dep_state is not None and not force and os.path.exists(app_path):
+        try:
+            src_state = _go_source_state(src_files, _read_json(fmt_index_path) or {})
+        except OSError:
+            src_state = {}
+        src_state.update(dep_state)
+        if _go_build_manifest(src_state, build_line) == _read_json(manifest_path):
+            if trace:
+                print("\t{0} is up to date".format(app_name))
+            return None
+
+    # Reformat the source code that changed since it was last reformatted.
     try:
-        cmd_line = "go fmt {0}".format(os.path.join(cur_dir, app_dir, app_name, '*.go'))
-        if trace:
-            print("Issuing: {0}".format(cmd_line))
-        if debug:
-            print("\t Debug: {0}".format(cmd_line))
-        else:
-            irc = do_cmd(cmd_line)
-            if not irc == 0:
-                return Error("Error: '%s' failed!" % cmd_line)
+        err, src_state = _go_fmt_changed(src_files, fmt_index_path, debug, trace, force, prefix)
     except Exception as excp:                   # pylint: disable=broad-except
         if trace:
             print("Execption:", excp)
-        err = Error("Error: '%s' failed!" % cmd_line)
+        err = Error(8, "Error: 'go fmt' of {0} failed!".format(app_name))
     if err:
         return err
 
     # Build the packages.
     try:
-        cmd_line = 'go build -o {0} -v {1}'.format(
-            os.path.join(tmp_dir, 'bin', app_name),
-            os.path.join(cur_dir, app_dir, app_name, '*.go'))
+        cmd_line = build_argv
         # Setup output directory if needed.
         tmp_bin = os.path.join(tmp_dir, 'bin')
         if not os.path.exists(tmp_bin):
             if trace:
                 print("Making: {0}".format(tmp_bin))
-            os.makedirs(tmp_bin, 0o777)
+            os.makedirs(tmp_bin, 0o777, exist_ok=True)
         # Build the packages.
         if trace:
-            print("Issuing: {0}".format(cmd_line))
+            print("Issuing: {0}".format(cmd_str(cmd_line)))
         if debug:
-            print("\t Debug: {0}".format(cmd_line))
+            print("\t Debug: {0}".format(cmd_str(cmd_line)))
         else:
-            irc = do_cmd(cmd_line)
+            if prefix is None:
+                irc = do_cmd(cmd_line, env=build_env)
+            else:
+                irc = do_cmd_prefixed(cmd_line, prefix, env=build_env)
             if not irc == 0:
-                return Error("Error: '%s' failed!" % cmd_line)
+                return Error(8, "Error: '%s' failed!" % cmd_str(cmd_line))
+            if dep_state is not None:
+                src_state.update(dep_state)
+                _write_json(manifest_path, _go_build_manifest(src_state, build_line))
+            elif os.path.exists(manifest_path):
+                os.remove(manifest_path)
     except Exception as excp:                   # pylint: disable=broad-except
         if trace:
             print("Execption:", excp)
-        err = Error("Error: '%s' failed!" % cmd_line)
+        err = Error(8, "Error: '%s' failed!" % cmd_str(cmd_line))
     if err:
         return err
 
     return None
 
 
+#---------------------------------------------------------------------
+#   go_build_many -- Build several Golang Applications in parallel
+#---------------------------------------------------------------------
+
+GoBuildResult = collections.namedtuple('GoBuildResult', 'app_name error elapsed')
+
+@traced('go')
+def go_build_many(app_dir, app_names, jobs=None, debug=False, trace=False, force=False):
+    """ Build several golang applications at the same time
+
+    Each application is reformatted and built by go_build_app() in its
+    own worker thread so that a slow application does not hold up the
+    others.  The output of the go commands is printed as it arrives with
+    each line starting with '[app_name] '.
+
+    Args:
+        app_dir (str):      Application Directory (see go_build_app)
+        app_names (list):   Application Names
+        jobs (int):         maximum number of builds running at the same
+                            time, default is the number of CPUs
+        debug (bool):       True == dont execute commands
+        trace (bool):       True == trace actions
+        force (bool):       True == build even if nothing has changed
+
+    Returns:
+        list of GoBuildResult in the order of app_names where error is
+        None for a successful build
+    """
+    jobs = jobs or os.cpu_count() or 1
+
+    def build(app_name):
+        start_time = time.time()
+        try:
+            err = go_build_app(app_dir, app_name, debug, trace, force,
+                               prefix='[{0}] '.format(app_name))
+        except Exception as excp:                   # pylint: disable=broad-except
+            err = Error(8, "Error: build of {0} failed: {1}".format(app_name, excp))
+        return GoBuildResult(app_name, err, time.time() - start_time)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(build, app_names))
+
+
 #---------------------------------------------------------------------
 #   go_get -- Go Get Specific Packages if not already downloaded
 #---------------------------------------------------------------------
 
-def go_get(pkg_dir, go_dir=None, debug_flag=False):
+class GoPackageIndex:
+    """ This object is an in-memory index of the go packages that have
+        already been downloaded into a Go Directory.  Both the GOPATH
+        'src' directory and the module mode 'pkg/mod' directory are
+        covered.  Each directory is only listed once no matter how many
+        packages are looked up.
+    """
+
+    def __init__(self, go_dir=None):
+        """ Set default parameters.
+        """
+        if go_dir is None:
+            go_dir = '~/go'
+        self.go_dir = absolute_path(go_dir)
+        self._listings = {}
+        self._modules = None
+        self._lock = threading.Lock()
+
+    def _entries(self, dir_path):
+        entries = self._listings.get(dir_path)
+        if entries is None:
+            try:
+                entries = set(os.listdir(dir_path))
+            except OSError:
+                entries = set()
+            self._listings[dir_path] = entries
+        return entries
+
+    def _in_src(self, pkg):
+        dir_path = os.path.join(self.go_dir, 'src')
+        for part in pkg.split('/'):
+            if part not in self._entries(dir_path):
+                return False
+            dir_path = os.path.join(dir_path, part)
+        return True
+
+    def _module_versions(self):
+        if self._modules is None:
+            self._modules = {}
+            mod_dir = os.path.join(self.go_dir, 'pkg', 'mod')
+            for dir_path, dir_names, _ in os.walk(mod_dir):
+                if dir_path == mod_dir and 'cache' in dir_names:
+                    dir_names.remove('cache')
+                for dir_name in list(dir_names):
+                    if '@' in dir_name:
+                        dir_names.remove(dir_name)
+                        rel_path = os.path.relpath(os.path.join(dir_path, dir_name), mod_dir)
+                        module, version = rel_path.split('@', 1)
+                        module = go_mod_unescape(module.replace(os.sep, '/'))
+                        self._modules.setdefault(module, set()).add(go_mod_unescape(version))
+        return self._modules
+
+    def modules(self):
+        """ Return the set of module paths found in 'pkg/mod'.
+        """
+        return set(self._module_versions())
+
+    def contains(self, pkg):
+        """ Check if a package, optionally followed by '@version', has
+            already been downloaded.  Without a version or with '@latest'
+            any downloaded version will do.  Otherwise the version must be
+            an exact one, such as v1.2.3, and that version of the module
+            must be in 'pkg/mod'.  A module only provides the packages of
+            its own major version, so github.com/x/y does not provide
+            github.com/x/y/v2.
+        """
+        pkg, _, version = pkg.partition('@')
+        if version == 'latest':
+            version = ''
+        if version and not re.match(r'v[0-9]+\.[0-9]+\.[0-9]+([-+].*)?$', version):
+            # Queries such as branches or version prefixes are left to go.
+            return False
+        with self._lock:
+            if not version and self._in_src(pkg):
+                return True
+            modules = self._module_versions()
+            parts = pkg.split('/')
+            for i in range(len(parts), 0, -1):
+                if i < len(parts) and re.match(r'v([2-9]|[1-9][0-9]+)$', parts[i]):
+                    # The rest of the path starts with a major version suffix.
+                    continue
+                versions = modules.get('/'.join(parts[:i]))
+                if versions and (not version or version in versions):
+                    return True
+        return False
+
+
+def go_mod_unescape(path):
+    """ Convert a module cache directory path back to the module path
+        (see go_mod_escape).
+    """
+    parts = path.split('!')
+    return parts[0] + ''.join(part[:1].upper() + part[1:] for part in parts[1:])
+
+
+@traced('go')
+def go_get(pkg_dir, go_dir=None, debug_flag=False, mirror=None):
     """ Go get a go package if it is not already loaded.
         The Go Directory is composed of 'bin', 'pkg' and 'src'. All packages
         are loaded into 'src'.  So, we can just check there to see if the
         package has already been loaded or not.  If the package is in a
         repository, the full path must be used excluding the repository type.
+        If a GoModMirror is given (or named by $GO_MOD_MIRROR), the package
+        is first fetched into the mirror if needed and then loaded from it.
         example:
             goget('github.com/2kranki/go_util')
     """
@@ -612,11 +2640,572 @@ def go_get(pkg_dir, go_dir=None, debug_flag=False):
     go_pkg_dir = absolute_path(os.path.join(go_dir, 'src', pkg_dir))
 
     if not os.path.exists(go_pkg_dir):
-        cmd_line = 'go get {0}'.format(pkg_dir)
+        mirror = mirror or GoModMirror.default()
+        env = None
+        if mirror is not None and not debug_flag:
+            env = mirror.fill_env([pkg_dir])
+        cmd_line = ['go', 'get', pkg_dir]
         if debug_flag:
-            print("\t Debug: {0}".format(cmd_line))
+            print("\t Debug: {0}".format(cmd_str(cmd_line)))
         else:
-            do_cmd(cmd_line)
+            do_cmd(cmd_line, env=env)
+
+
+#---------------------------------------------------------------------
+#   go_get_many -- Go Get several Packages in parallel
+#---------------------------------------------------------------------
+
+GoGetResult = collections.namedtuple('GoGetResult', 'pkg fetched error elapsed')
+
+@traced('go')
+def go_get_many(pkgs, go_dir=None, jobs=4, debug_flag=False, mirror=None):
+    """ Go get the packages that are not already loaded
+
+    All of the packages are first looked up in one GoPackageIndex of the
+    Go Directory.  The missing ones are then fetched with at most 'jobs'
+    'go get' commands running at the same time.  Inside a module (the
+    current directory has a 'go.mod'), they are fetched by a single
+    'go get' since concurrent ones would all rewrite 'go.mod'.
+
+    In module mode a package counts as loaded once its module is in
+    'pkg/mod' even if the current go.mod does not require it yet.  This
+    only warms the module cache; run 'go get' to add the requirement.
+
+    Args:
+        pkgs (list):        package paths, optionally with '@version'
+        go_dir (str):       Go Directory, default is '~/go'
+        jobs (int):         maximum number of 'go get' running at once
+        debug_flag (bool):  True == dont execute commands
+        mirror (GoModMirror): module mirror to fetch through, default is
+                            the one named by $GO_MOD_MIRROR if any
+
+    Returns:
+        dictionary of package to GoGetResult where fetched is True if
+        'go get' was run and error is None or an Error object
+    """
+    index = GoPackageIndex(go_dir)
+    results = {}
+    missing = []
+    for pkg in pkgs:
+        if pkg in results:
+            continue
+        results[pkg] = GoGetResult(pkg, False, None, 0.0)
+        if not index.contains(pkg):
+            missing.append(pkg)
+
+    mirror = mirror or GoModMirror.default()
+    env = None
+    if mirror is not None and missing and not debug_flag:
+        env = mirror.fill_env(missing, jobs)
+
+    def fetch(batch):
+        cmd_line = ['go', 'get'] + batch
+        start_time = time.time()
+        err = None
+        if debug_flag:
+            print("\t Debug: {0}".format(cmd_str(cmd_line)))
+        else:
+            try:
+                do_sys(cmd_line, env=env)
+            except (OSError, subprocess.CalledProcessError) as excp:
+                msg = (getattr(excp, 'stderr', None) or b'').decode('utf-8', errors='replace')
+                err = Error(8, "Error: '{0}' failed! {1}".format(cmd_str(cmd_line), msg.strip()))
+        elapsed = time.time() - start_time
+        return [GoGetResult(pkg, True, err, elapsed) for pkg in batch]
+
+    if missing:
+        if os.path.exists('go.mod'):
+            batches = [missing]
+        else:
+            batches = [[pkg] for pkg in missing]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            for batch_results in executor.map(fetch, batches):
+                for result in batch_results:
+                    results[result.pkg] = result
+    return results
+
+
+#---------------------------------------------------------------------
+#                       Go Module Mirror Class
+#---------------------------------------------------------------------
+
+class GoModMirror:
+    """ This object maintains a local file system Go module mirror.
+
+        The mirror directory is a go module cache (GOMODCACHE) and its
+        'cache/download' directory has the layout of a module proxy, so it
+        can be used as GOPROXY=file://.../cache/download.  Packages are
+        fetched into it once, together with their dependencies, and later
+        go commands are pointed at it so that fresh workspaces do not fetch
+        or resolve the modules over the network again.
+
+        The number of lookups that were found in the mirror (hits) and
+        that had to be fetched (misses) is kept in 'stats.json'.
+
+        Modules that are not in the mirror are fetched from $GOPROXY (or
+        the default proxy) and the checksum database is consulted as usual
+        unless 'offline' is set, in which case go commands only use the
+        mirror.
+    """
+
+    def __init__(self, path, offline=False):
+        """ Set default parameters.
+        """
+        self.path = absolute_path(path)
+        self.offline = offline
+
+    @staticmethod
+    def default():
+        """ Return the mirror named by $GO_MOD_MIRROR or None.  Setting
+            $GO_MOD_MIRROR_OFFLINE to 1 makes it an offline mirror.
+        """
+        path = os.getenv('GO_MOD_MIRROR')
+        if path:
+            return GoModMirror(path, os.getenv('GO_MOD_MIRROR_OFFLINE') == '1')
+        return None
+
+    def proxy_dir(self):
+        """ Return the directory that has the module proxy layout.
+        """
+        return os.path.join(self.path, 'cache', 'download')
+
+    def proxy_url(self):
+        """ Return the GOPROXY value for the mirror.
+        """
+        return 'file://' + self.proxy_dir()
+
+    def upstream_proxy(self):
+        """ Return the GOPROXY list used for modules that are not in the
+            mirror: $GOPROXY without the mirror itself, or the default.
+        """
+        proxies = [proxy for proxy in os.getenv('GOPROXY', '').split(',')
+                   if proxy and proxy != self.proxy_url()]
+        return ','.join(proxies) or 'https://proxy.golang.org,direct'
+
+    def env(self):
+        """ Return the environment variables that make go commands use the
+            mirror first.  An offline mirror is used on its own and, since
+            the checksums were verified when the modules were fetched into
+            it, the checksum database is not consulted.
+        """
+        if self.offline:
+            return {'GOPROXY': self.proxy_url(), 'GOSUMDB': 'off'}
+        return {'GOPROXY': '{0},{1}'.format(self.proxy_url(), self.upstream_proxy())}
+
+    def contains(self, pkg):
+        """ Check if the module providing a package, optionally followed by
+            '@version', is in the mirror.
+        """
+        pkg, _, version = pkg.partition('@')
+        parts = pkg.split('/')
+        for i in range(len(parts), 0, -1):
+            version_dir = os.path.join(self.proxy_dir(), go_mod_escape('/'.join(parts[:i])), '@v')
+            if version and version != 'latest':
+                if os.path.exists(os.path.join(version_dir, version + '.zip')):
+                    return True
+            elif os.path.exists(os.path.join(version_dir, 'list')):
+                return True
+        return False
+
+    def prefetch(self, pkgs, jobs=4):
+        """ Fetch packages and their dependencies into the mirror.  Each
+            package is resolved by 'go get' in a scratch module whose module
+            cache is the mirror.
+
+            Returns:
+                dictionary of package to None or Error object
+        """
+        flags = os.getenv('GOFLAGS', '').split()
+        if '-modcacherw' not in flags:
+            flags.append('-modcacherw')
+        env = {'GOMODCACHE': self.path, 'GOFLAGS': ' '.join(flags),
+               'GOPROXY': self.upstream_proxy()}
+        os.makedirs(self.path, 0o777, exist_ok=True)
+
+        def fetch(pkg):
+            with tempfile.TemporaryDirectory() as work_dir:
+                try:
+                    do_sys(['go', 'mod', 'init', 'mirror.prefetch'], cwd=work_dir, env=env)
+                    do_sys(['go', 'get', pkg], cwd=work_dir, env=env)
+                except (OSError, subprocess.CalledProcessError) as excp:
+                    msg = (getattr(excp, 'stderr', None) or b'').decode('utf-8', errors='replace')
+                    return Error(8, "Error: could not fetch {0} into the mirror! {1}"
+                                 .format(pkg, msg.strip()))
+            return None
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            return dict(zip(pkgs, executor.map(fetch, pkgs)))
+
+    def fill(self, pkgs, jobs=4):
+        """ Make certain that the packages are in the mirror fetching the
+            missing ones and counting hits and misses.
+
+            Returns:
+                dictionary of the missing packages to None or Error object
+        """
+        missing = [pkg for pkg in pkgs if not self.contains(pkg)]
+        self.record(len(pkgs) - len(missing), len(missing))
+        if not missing:
+            return {}
+        return self.prefetch(missing, jobs)
+
+    def fill_env(self, pkgs, jobs=4):
+        """ Fill the mirror with the packages, warning about the ones that
+            could not be fetched into it, which go then fetches itself.
+
+            Returns:
+                the environment variables from env()
+        """
+        for pkg, err in self.fill(pkgs, jobs).items():
+            if err is not None:
+                err.stderr()
+                print("Warning: {0} is not in the mirror".format(pkg), file=sys.stderr)
+        return self.env()
+
+    def record(self, hits, misses):
+        """ Add to the hit and miss counts kept in the mirror.
+        """
+        os.makedirs(self.path, 0o777, exist_ok=True)
+        with open(os.path.join(self.path, 'stats.json'), 'a+') as stats_file:
+            if fcntl is not None:
+                fcntl.flock(stats_file, fcntl.LOCK_EX)
+            stats_file.seek(0)
+            try:
+                counts = json.loads(stats_file.read())
+            except ValueError:
+                counts = {}
+            counts['hits'] = counts.get('hits', 0) + hits
+            counts['misses'] = counts.get('misses', 0) + misses
+            stats_file.seek(0)
+            stats_file.truncate()
+            json.dump(counts, stats_file)
+            stats_file.flush()
+            if fcntl is not None:
+                fcntl.flock(stats_file, fcntl.LOCK_UN)
+
+    def stats(self):
+        """ Return the hit and miss counts and the hit rate of the mirror.
+        """
+        counts = _read_json(os.path.join(self.path, 'stats.json')) or {}
+        hits = counts.get('hits', 0)
+        misses = counts.get('misses', 0)
+        total = hits + misses
+        return {'hits': hits, 'misses': misses,
+                'hit_rate': float(hits) / total if total else 0.0}
+
+
+def go_mod_escape(path):
+    """ Escape a module path the way the go module cache does by replacing
+        each upper case letter with '!' followed by the lower case letter.
+    """
+    return ''.join('!' + char.lower() if char.isupper() else char for char in path)
+
+
+#---------------------------------------------------------------------
+#                           Warm Daemon
+#---------------------------------------------------------------------
+
+def daemon_socket_dir():
+    """ Return a directory for the daemon's socket that only this user can
+        use (see daemon_socket.socket_dir()).
+    """
+    return daemon_socket.socket_dir()
+
+
+def daemon_socket_path():
+    """ Return the unix socket of the warm daemon or None if scripts should
+        not use it (see daemon_socket.socket_path()).
+    """
+    return daemon_socket.socket_path(_util_file())
+
+
+def _util_file():
+    return os.path.realpath(__file__)
+
+
+def _util_state():
+    """ Return what identifies this version of util.py.
+    """
+    try:
+        file_stat = os.stat(_util_file())
+    except OSError:
+        return None
+    return (file_stat.st_mtime_ns, file_stat.st_size)
+
+
+_peer_uid = daemon_socket.peer_uid
+
+
+def _daemon_start(socket_path):
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), '--daemon',
+                      '--socket', socket_path],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                     stderr=subprocess.DEVNULL, start_new_session=True)
+
+
+def daemon_run(script, argv, socket_path=None, start=True):
+    """ Run a script in the warm daemon.  The daemon gets this process's
+        stdin, stdout and stderr so the script's output, and that of the
+        commands that it runs, goes straight to them.
+
+        :param start:
+            start the daemon in the background if it is not running so that
+            later runs can use it
+
+        Returns:
+            the script's exit code or None if the daemon is not running, in
+            which case the script should run in this process
+    """
+    socket_path = socket_path or daemon_socket_path()
+    if socket_path is None:
+        return None
+    request = {'script': os.path.abspath(script), 'argv': list(argv), 'cwd': os.getcwd(),
+               'env': dict(os.environ), 'util': _util_file()}
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            if start:
+                _daemon_start(socket_path)
+            return None
+        if _peer_uid(sock) != os.getuid():
+            print("Warning: {0} is not served by this user, not using it".format(socket_path),
+                  file=sys.stderr)
+            return None
+        for stream in (sys.stdout, sys.stderr):
+            stream.flush()
+        try:
+            socket.send_fds(sock, [b'R'], [0, 1, 2])
+            sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            accepted = sock.recv(1) == b'+'
+        except OSError:
+            accepted = False
+        if not accepted:
+            # The daemon runs another util.py or an older version of it,
+            # and has stopped if it is out of date.
+            if start:
+                _daemon_start(socket_path)
+            return None
+        reply = b''
+        try:
+            while not reply.endswith(b'\n'):
+                data = sock.recv(64)
+                if not data:
+                    break
+                reply += data
+        except KeyboardInterrupt:
+            # Closing the connection interrupts the script in the daemon.
+            return 130
+        try:
+            return int(reply)
+        except ValueError:
+            print("Error: the daemon did not return an exit code", file=sys.stderr)
+            return 1
+    finally:
+        sock.close()
+
+
+def _daemon_exec(conn, code_cache):
+    """ Run one script request in a forked daemon process.  A request from
+        a script that uses another util.py is refused.
+
+        Returns:
+            exit code or None if the request was refused
+    """
+    import signal                           # pylint: disable=import-outside-toplevel
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    _, fds, _, _ = socket.recv_fds(conn, 1, 3)
+    request = b''
+    while not request.endswith(b'\n'):
+        data = conn.recv(65536)
+        if not data:
+            return 1
+        request += data
+    request = json.loads(request)
+    if request.get('util') != _util_file():
+        for fd in fds:
+            os.close(fd)
+        return None
+    conn.sendall(b'+')
+    for target, fd in enumerate(fds):
+        os.dup2(fd, target)
+        os.close(fd)
+    sys.stdin = os.fdopen(0, 'r', closefd=False)
+    line_buffered = os.isatty(1) or bool(request['env'].get('PYTHONUNBUFFERED'))
+    sys.stdout = os.fdopen(1, 'w', buffering=1 if line_buffered else -1, closefd=False)
+    sys.stderr = os.fdopen(2, 'w', buffering=1, closefd=False)
+    os.environ.clear()
+    os.environ.update(request['env'])
+    os.environ['UTIL_DAEMON_CHILD'] = '1'
+    os.chdir(request['cwd'])
+    script = request['script']
+    sys.argv = [script] + request['argv']
+    sys.path[0] = os.path.dirname(script)
+
+    def watch():
+        # The client closes the connection if it is interrupted.
+        if not conn.recv(1):
+            os.kill(os.getpid(), signal.SIGINT)
+
+    threading.Thread(target=watch, daemon=True).start()
+    try:
+        file_stat = os.stat(script)
+        code = code_cache.get(script)
+        if code is None or code[0] != file_stat.st_mtime_ns:
+            with open(script, 'rb') as script_file:
+                code = (file_stat.st_mtime_ns, compile(script_file.read(), script, 'exec'))
+        # A real __main__ module so that pickle (and so ProcessPoolExecutor)
+        # finds the script's functions by name.
+        import types                        # pylint: disable=import-outside-toplevel
+        main = types.ModuleType('__main__')
+        main.__file__ = script
+        main.__builtins__ = __builtins__
+        sys.modules['__main__'] = main
+        exec(code[1], main.__dict__)        # pylint: disable=exec-used
+        irc = 0
+    except SystemExit as excp:
+        if excp.code is None or isinstance(excp.code, int):
+            irc = excp.code or 0
+        else:
+            print(excp.code, file=sys.stderr)
+            irc = 1
+    except KeyboardInterrupt:
+        irc = 130
+    except BaseException:                   # pylint: disable=broad-except
+        import traceback                    # pylint: disable=import-outside-toplevel
+        traceback.print_exc()
+        irc = 1
+    for stream in (sys.stdout, sys.stderr):
+        try:
+            stream.flush()
+        except OSError:
+            pass
+    return irc
+
+
+def daemon_serve(socket_path, idle_timeout=600.0, max_children=8):
+    """ Serve script requests on a unix socket until no request has
+        arrived and none has been running for idle_timeout seconds.
+
+        The modules that scripts use are imported, and the scripts next to
+        util.py are compiled, once at start up.  Each request is then run
+        in a forked copy of this process with at most max_children of them
+        running at once.  The daemon stops as soon as a request arrives
+        after util.py has changed.
+
+        Returns:
+            0 or 4 if another daemon is already serving the socket
+    """
+    import signal                           # pylint: disable=import-outside-toplevel
+    import socketserver                     # pylint: disable=import-outside-toplevel
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+        return 4
+    except OSError:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+    finally:
+        probe.close()
+
+    for value in list(globals().values()):
+        if isinstance(value, _LazyModule):
+            getattr(value, '__name__')
+    import asyncio                          # pylint: disable=import-outside-toplevel,unused-import
+    util_state = _util_state()
+    code_cache = {}
+    for script in glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), '*.py')):
+        try:
+            with open(script, 'rb') as script_file:
+                code_cache[script] = (os.stat(script).st_mtime_ns,
+                                      compile(script_file.read(), script, 'exec'))
+        except (OSError, SyntaxError):
+            pass
+
+    class Handler(socketserver.BaseRequestHandler):
+        """ Run the script of one request.
+        """
+
+        def handle(self):
+            if _peer_uid(self.request) != os.getuid():
+                return
+            irc = _daemon_exec(self.request, code_cache)
+            if irc is None:
+                return
+            try:
+                self.request.sendall('{0}\n'.format(irc).encode('ascii'))
+            except OSError:
+                pass
+
+    class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+        """ Unix socket server forking a process per request.
+        """
+        last_active = time.monotonic()
+        stale = False
+
+        def process_request(self, request, client_address):
+            if _util_state() != util_state:
+                # util.py changed, so stop and let the client start a new
+                # daemon.  The socket is removed first so that the new
+                # daemon can take its place right away.
+                self.stale = True
+                try:
+                    os.unlink(socket_path)
+                except OSError:
+                    pass
+                self.shutdown_request(request)
+                return
+            self.collect_children()
+            self.last_active = time.monotonic()
+            super().process_request(request, client_address)
+
+    def terminate(*_):
+        sys.exit(0)
+
+    # Remove the socket when stopped with SIGTERM.
+    signal.signal(signal.SIGTERM, terminate)
+    old_umask = os.umask(0o177)
+    try:
+        server = Server(socket_path, Handler)
+    finally:
+        os.umask(old_umask)
+    server.max_children = max_children
+    server.timeout = min(1.0, idle_timeout)
+    try:
+        while not server.stale:
+            server.handle_request()
+            server.collect_children()
+            if server.active_children:
+                server.last_active = time.monotonic()
+            elif time.monotonic() - server.last_active >= idle_timeout:
+                break
+    finally:
+        server.server_close()
+        if not server.stale:
+            try:
+                os.unlink(socket_path)
+            except OSError:
+                pass
+    return 0
+
+
+def daemon_main(argv):
+    """ Command line of the warm daemon (util.py --daemon ...).
+    """
+    prs = argparse.ArgumentParser(prog='util.py --daemon')
+    prs.add_argument('--socket', dest='socket_path', default=None,
+                     help='unix socket path, default from UTIL_DAEMON')
+    prs.add_argument('--idle', type=float, default=600.0, dest='idle_timeout',
+                     help='seconds without requests before exiting')
+    prs.add_argument('--max-children', type=int, default=8, dest='max_children',
+                     help='maximum number of scripts running at once')
+    args = prs.parse_args(argv)
+    socket_path = args.socket_path or daemon_socket_path()
+    if socket_path is None:
+        print("Error: set UTIL_DAEMON or give --socket")
+        return 4
+    return daemon_serve(socket_path, args.idle_timeout, args.max_children)
 
 
 #---------------------------------------------------------------------
@@ -629,9 +3218,21 @@ class MainBase:
 
     def __init__(self):
         self.args = None
-        self.arg_prs = argparse.ArgumentParser()
+        self._arg_prs = None
         self.result_code = 0
 
+    @property
+    def arg_prs(self):
+        """ The argument parser, which is only built when it is first used.
+        """
+        if self._arg_prs is None:
+            self._arg_prs = argparse.ArgumentParser()
+        return self._arg_prs
+
+    @arg_prs.setter
+    def arg_prs(self, value):
+        self._arg_prs = value
+
     def arg_parse_exec(self):
         """ Execute the argument parsing.
             Warning - Main should override this method if additional cli
@@ -668,29 +3269,69 @@ class MainBase:
         self.arg_prs.add_argument('-v', '--verbose', action='count', default=1,
                                   dest='verbose', help='increase output verbosity'
                                  )
+        self.arg_prs.add_argument('--stats', action='store', dest='stats_format',
+                                  default=None, choices=['table', 'json'],
+                                  help='Print the resources used by each child process'
+                                 )
+        self.arg_prs.add_argument('--profile', action='store', dest='profile_path',
+                                  default=None, metavar='PATH',
+                                  help='Write a Chrome trace of the run to PATH'
+                                 )
         self.arg_prs.add_argument('args', nargs=argparse.REMAINDER, default=[])
 
     def exec_pgm(self):                                 #pylint: disable=no-self-use
         """ Program Execution
             Warning - Main should override this method and make certain that
-            it returns an exit code in self.result_code.
+            it returns an exit code in self.result_code.  It may also be
+            written as a coroutine (async def) in which case run() executes
+            it with asyncio.run().
         """
         self.result_code = 24
         print("ERROR: exec_pgm is NOT implemented!")
 
     def run(self):
         """ Run the program keeping track of how long that it takes.
+            If the warm daemon is enabled (see daemon_socket_path()) and
+            running, the script is run by it instead.
         """
+        if daemon_socket_path() is not None:
+            main = sys.modules.get('__main__')
+            script = getattr(main, '__file__', None)
+            if script is not None:
+                irc = daemon_run(script, sys.argv[1:])
+                if irc is not None:
+                    sys.exit(irc)
         start_time = time.time()
+        start_ns = time.perf_counter_ns()
         self.arg_parse_exec()
         # arguments and options are in self.args.
+        profile_path = getattr(self.args, 'profile_path', None)
+        if profile_path:
+            tracer.start(start_ns)
+            tracer.add('arg_parse', 'main', start_ns, time.perf_counter_ns())
+        stats_format = getattr(self.args, 'stats_format', None)
+        if stats_format:
+            child_stats.start()
         if self.result_code == 0:
             try:
-                self.exec_pgm()
+                with tracer.span('exec_pgm', 'main'):
+                    result = self.exec_pgm()
+                    if hasattr(result, '__await__'):
+                        import asyncio      # pylint: disable=import-outside-toplevel
+                        asyncio.run(result)
             except Exception as excp:  # pylint: disable=broad-except
                 print("Execption:", excp)
                 self.result_code = 20
         end_time = time.time()
+        if profile_path:
+            tracer.stop()
+            try:
+                tracer.save(profile_path)
+            except OSError as excp:
+                print("Error: could not write profile {0}: {1}".format(profile_path, excp))
+        if stats_format:
+            child_stats.enabled = False
+            print(child_stats.report(stats_format))
         if self.args.verbose > 0 or self.args.flg_debug:
             if int(self.result_code) == 0:
                 print("...Successful completion.")
@@ -711,6 +3352,11 @@ class MainBase:
 ################################################################################
 
 if __name__ == '__main__':
+    if sys.argv[1:2] == ['--daemon']:
+        # Serve with the importable util module so that the scripts share it.
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import util                         # pylint: disable=import-self
+        sys.exit(util.daemon_main(sys.argv[2:]))
     print("Error: Sorry, util.py provides classes and functions for use by other scripts.")
     print("\tIt is not meant to be run by itself.")
     sys.exit(4)
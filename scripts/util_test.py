@@ -36,14 +36,62 @@ The module must be executed from the repository that contains the util.py.
 #   For more information, please refer to <http://unlicense.org/>
 
 
+import asyncio
+from contextlib import redirect_stderr, redirect_stdout
+from http.server import BaseHTTPRequestHandler
 from io import StringIO
-from unittest import TestCase
+import errno
+import glob
+import json
+import shutil
+import socket
+import socketserver
+import subprocess
+import threading
+from unittest import TestCase, mock
 import      util
 import      os
 import      sys
+import      tempfile
+import      time
 
 
 
+def stand_in(bin_dir, name, script):
+    """ Create a stand-in shell script executable in bin_dir.
+    """
+    path = os.path.join(bin_dir, name)
+    with open(path, 'w') as f:
+        f.write('#!/bin/sh\n' + script)
+    os.chmod(path, 0o755)
+    return path
+
+
+class StandInTestCase(TestCase):
+    """ Put a temporary directory for stand-in executables first on PATH.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.bin_dir = self.tmp.name
+        self.log_path = os.path.join(self.bin_dir, 'calls.log')
+        self.old_path = os.environ['PATH']
+        os.environ['PATH'] = self.bin_dir + os.pathsep + self.old_path
+        os.environ['STAND_IN_LOG'] = self.log_path
+        util.docker_image_inventory.invalidate()
+
+    def tearDown(self):
+        os.environ['PATH'] = self.old_path
+        del os.environ['STAND_IN_LOG']
+        util.docker_image_inventory.invalidate()
+        self.tmp.cleanup()
+
+    def calls(self):
+        if not os.path.exists(self.log_path):
+            return []
+        with open(self.log_path) as f:
+            return f.read().splitlines()
+
 
 ################################################################################
 #                               Test Classes
@@ -67,6 +115,173 @@ class testAbsolutePath(TestCase):
         self.assertEqual(a,b)
 
 
+class testAbsolutePathCache(TestCase):
+
+    def setUp(self):
+        util.forget_paths()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.addCleanup(util.forget_paths)
+        self.addCleanup(os.chdir, os.getcwd())
+        os.environ['UTIL_TEST_DIR'] = self.tmp_dir.name
+        self.addCleanup(os.environ.pop, 'UTIL_TEST_DIR')
+
+    def test_conversion(self):
+        for path in ('a/b.txt', './a/../b.txt', '~/x', '~', '/tmp//x/', '$UTIL_TEST_DIR/f',
+                     '${UTIL_TEST_DIR}/d/../f', '$UTIL_TEST_NONE/f', '.', '..', 'x/..',
+                     './~', 'x/../~', '$UTIL_TEST_NONE/../~root', 'a/~b', '~/a/~'):
+            expected = os.path.abspath(os.path.expandvars(os.path.expanduser(
+                os.path.normpath(path))))
+            self.assertEqual(util.absolute_path(path), expected)
+            self.assertEqual(util.absolute_path(path), expected)
+
+    def test_invalidation(self):
+        self.assertEqual(util.absolute_path('$UTIL_TEST_DIR/f'),
+                         os.path.join(self.tmp_dir.name, 'f'))
+        os.environ['UTIL_TEST_DIR'] = '/other'
+        self.assertEqual(util.absolute_path('$UTIL_TEST_DIR/f'), '/other/f')
+        os.chdir(self.tmp_dir.name)
+        self.assertEqual(util.absolute_path('x/y'),
+                         os.path.join(os.getcwd(), 'x', 'y'))
+        os.chdir('/')
+        self.assertEqual(util.absolute_path('x/y'), '/x/y')
+
+    def test_create_dirs(self):
+        calls = []
+        mkdir = os.mkdir
+        def counted(*args, **kwargs):
+            calls.append(args[0])
+            return mkdir(*args, **kwargs)
+        os.mkdir = counted
+        try:
+            paths = ['$UTIL_TEST_DIR/a/b/f{0}'.format(i) for i in range(100)]
+            results = util.absolute_paths(paths, create_dirs=True)
+            for path in paths:
+                util.absolute_path(path, create_dirs=True)
+            util.absolute_path('$UTIL_TEST_DIR/a/g', create_dirs=True)
+        finally:
+            os.mkdir = mkdir
+        self.assertEqual(results[5], os.path.join(self.tmp_dir.name, 'a', 'b', 'f5'))
+        self.assertTrue(os.path.isdir(os.path.join(self.tmp_dir.name, 'a', 'b')))
+        self.assertEqual(sorted(calls), [os.path.join(self.tmp_dir.name, 'a'),
+                                         os.path.join(self.tmp_dir.name, 'a', 'b')])
+
+    def test_create_dirs_file(self):
+        file_path = os.path.join(self.tmp_dir.name, 'a')
+        with open(file_path, 'w') as f:
+            f.write('x')
+        self.assertEqual(util.absolute_path('$UTIL_TEST_DIR/a/f', create_dirs=True),
+                         os.path.join(file_path, 'f'))
+        self.assertTrue(os.path.isfile(file_path))
+        # The file is not remembered as a directory.
+        os.remove(file_path)
+        util.absolute_path('$UTIL_TEST_DIR/a/f', create_dirs=True)
+        self.assertTrue(os.path.isdir(file_path))
+
+
+class testSyncTree(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.src = os.path.join(self.tmp_dir.name, 'src')
+        self.dst = os.path.join(self.tmp_dir.name, 'dst')
+        self.write('.bashrc', 'export A=1\n')
+        self.write('bin/tool', '#!/bin/sh\n', 0o755)
+        self.write('.config/app/settings.json', '{}' * 100000)
+        self.write('.config/empty', '')
+        os.symlink('bin/tool', os.path.join(self.src, 'tool'))
+
+    def write(self, name, text, mode=0o644):
+        path = os.path.join(self.src, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as src_file:
+            src_file.write(text)
+        os.chmod(path, mode)
+        return path
+
+    def read(self, name):
+        with open(os.path.join(self.dst, name)) as dst_file:
+            return dst_file.read()
+
+    def test_copy(self):
+        result = util.sync_tree(self.src, self.dst, jobs=4)
+        self.assertEqual((result.files, result.copied, result.skipped), (5, 5, 0))
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.bytes, 11 + 10 + 200000)
+        self.assertEqual(self.read('.config/app/settings.json'), '{}' * 100000)
+        self.assertEqual(self.read('.config/empty'), '')
+        self.assertEqual(os.readlink(os.path.join(self.dst, 'tool')), 'bin/tool')
+        for name in ('bin/tool', '.bashrc', 'bin', '.config/app'):
+            src_stat = os.stat(os.path.join(self.src, name))
+            dst_stat = os.stat(os.path.join(self.dst, name))
+            self.assertEqual(dst_stat.st_mode, src_stat.st_mode)
+            self.assertEqual(dst_stat.st_mtime_ns, src_stat.st_mtime_ns)
+        self.assertIn('5 copied', util.sync_report(result))
+
+    def test_incremental(self):
+        util.sync_tree(self.src, self.dst)
+        result = util.sync_tree(self.src, self.dst)
+        self.assertEqual((result.copied, result.skipped), (0, 5))
+        path = self.write('.bashrc', 'export A=2\n')
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10 ** 9))
+        result = util.sync_tree(self.src, self.dst)
+        self.assertEqual((result.copied, result.skipped), (1, 4))
+        self.assertEqual(self.read('.bashrc'), 'export A=2\n')
+        self.assertEqual([name for name in os.listdir(self.dst) if name.endswith('.sync')], [])
+
+    def test_removed_dst(self):
+        util.sync_tree(self.src, self.dst)
+        shutil.rmtree(self.dst)
+        result = util.sync_tree(self.src, self.dst)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(result.copied, 5)
+        self.assertEqual(self.read('.config/empty'), '')
+
+    def test_mode(self):
+        util.sync_tree(self.src, self.dst)
+        os.chmod(os.path.join(self.src, '.bashrc'), 0o600)
+        result = util.sync_tree(self.src, self.dst)
+        self.assertEqual((result.copied, result.skipped), (1, 4))
+        self.assertEqual(os.stat(os.path.join(self.dst, '.bashrc')).st_mode & 0o777, 0o600)
+
+    def test_checksum(self):
+        util.sync_tree(self.src, self.dst)
+        # Same size and mtime but different content is only seen by checksum.
+        path = os.path.join(self.dst, '.bashrc')
+        mtime_ns = os.stat(path).st_mtime_ns
+        with open(path, 'w') as dst_file:
+            dst_file.write('export A=9\n')
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+        self.assertEqual(util.sync_tree(self.src, self.dst).copied, 0)
+        self.assertEqual(util.sync_tree(self.src, self.dst, checksum=True).copied, 1)
+        self.assertEqual(self.read('.bashrc'), 'export A=1\n')
+
+    def test_fallback(self):
+        unsupported = mock.Mock(side_effect=OSError(errno.EXDEV, 'unsupported'))
+        with mock.patch.object(os, 'copy_file_range', unsupported, create=True), \
+                mock.patch.object(os, 'sendfile', unsupported, create=True):
+            result = util.sync_tree(self.src, self.dst)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(self.read('.config/app/settings.json'), '{}' * 100000)
+
+    def test_short_write(self):
+        unsupported = mock.Mock(side_effect=OSError(errno.EXDEV, 'unsupported'))
+        write = os.write
+        with mock.patch.object(os, 'copy_file_range', unsupported, create=True), \
+                mock.patch.object(os, 'sendfile', unsupported, create=True), \
+                mock.patch.object(os, 'write', lambda fd, data: write(fd, data[:1000])):
+            result = util.sync_tree(self.src, self.dst, jobs=1)
+        self.assertEqual(result.errors, [])
+        self.assertEqual(self.read('.config/app/settings.json'), '{}' * 100000)
+
+    def test_worker_error(self):
+        with mock.patch.object(util, '_copy_file', side_effect=ValueError('bad copy')):
+            result = util.sync_tree(self.src, self.dst)
+        self.assertTrue(result.errors)
+        self.assertTrue(all(message == 'bad copy' for _, message in result.errors))
+
+
 class testBuild(TestCase):
 
     def test_one(self):
@@ -78,6 +293,1119 @@ class testBuild(TestCase):
         self.assertEqual(err, None)
 
 
+class TimedCmd(util.Cmd):
+    """ Command that records when it ran and returns a fixed code.  With a
+        barrier it also waits for the other commands sharing the barrier
+        to be running at the same time and fails if they do not.
+    """
+
+    def __init__(self, name, log, deps=(), irc=0, delay=0.2, barrier=None):
+        self._name = name
+        self._log = log
+        self._deps = list(deps)
+        self._irc = irc
+        self._delay = delay
+        self._barrier = barrier
+
+    def cmd(self, **kwargs):
+        start = time.monotonic()
+        if self._barrier is not None:
+            try:
+                self._barrier.wait()
+            except threading.BrokenBarrierError:
+                return 99
+        time.sleep(self._delay)
+        self._log.append((self._name, start, time.monotonic()))
+        return self._irc
+
+    def depends(self):
+        return self._deps
+
+    def help(self):
+        return 'timed'
+
+    def name(self):
+        return self._name
+
+
+class testLazyImports(TestCase):
+
+    def test_import(self):
+        code = ("import sys; sys.path.insert(0, {0!r}); import util; "
+                "print(' '.join(sorted(sys.modules)))").format(os.path.dirname(util.__file__))
+        modules = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE,
+                                 check=True).stdout.decode().split()
+        for name in ('argparse', 'json', 'subprocess', 'http.client', 'concurrent.futures'):
+            self.assertNotIn(name, modules)
+
+    def test_use(self):
+        self.assertEqual(util.json.dumps([1]), '[1]')
+        self.assertEqual(util.urllib.parse.urlencode({'a': 1}), 'a=1')
+        main = util.MainBase()
+        self.assertIsNone(main._arg_prs)
+        self.assertIs(main.arg_prs, main.arg_prs)
+
+
+class testDoCmds(TestCase):
+
+    def setUp(self):
+        self.log = []
+
+    def names(self):
+        return [entry[0] for entry in self.log]
+
+    def test_sequential(self):
+        cmds = util.Cmds(TimedCmd('a', self.log, delay=0), TimedCmd('b', self.log, delay=0),
+                         TimedCmd('c', self.log, ['a'], delay=0))
+        self.assertEqual(cmds.do_cmds(['b', 'c']), 0)
+        self.assertEqual(self.names(), ['b', 'a', 'c'])
+
+    def test_sequential_failure(self):
+        cmds = util.Cmds(TimedCmd('a', self.log, irc=4, delay=0), TimedCmd('b', self.log, delay=0))
+        self.assertEqual(cmds.do_cmds(['a', 'b']), 4)
+        self.assertEqual(self.names(), ['a'])
+
+    def test_invalid(self):
+        cmds = util.Cmds(TimedCmd('a', self.log, ['nope']), TimedCmd('b', self.log, ['c']),
+                         TimedCmd('c', self.log, ['b']))
+        with redirect_stdout(StringIO()):
+            self.assertEqual(cmds.do_cmds(['x']), 8)
+            self.assertEqual(cmds.do_cmds(['a']), 8)
+            self.assertEqual(cmds.do_cmds(['b'], jobs=4), 8)
+        self.assertEqual(self.log, [])
+        with self.assertRaises(RuntimeError):
+            cmds.do_cmds([])
+
+    def test_parallel(self):
+        # pull and build only get past the barrier if they run at once.
+        barrier = threading.Barrier(2, timeout=10)
+        cmds = util.Cmds(TimedCmd('pull', self.log, delay=0, barrier=barrier),
+                         TimedCmd('build', self.log, delay=0, barrier=barrier),
+                         TimedCmd('deploy', self.log, ['pull', 'build'], delay=0))
+        self.assertEqual(cmds.do_cmds(['deploy'], jobs=4), 0)
+        times = {entry[0]: entry for entry in self.log}
+        self.assertGreaterEqual(times['deploy'][1], max(times['pull'][2], times['build'][2]))
+
+    def test_parallel_failure(self):
+        cmds = util.Cmds(TimedCmd('a', self.log), TimedCmd('b', self.log, irc=3, delay=0.1),
+                         TimedCmd('c', self.log, ['b']), TimedCmd('d', self.log, ['c']),
+                         TimedCmd('e', self.log, ['a']))
+        self.assertEqual(cmds.do_cmds(['a', 'b', 'c', 'd', 'e'], jobs=2), 3)
+        self.assertEqual(sorted(self.names()), ['a', 'b', 'e'])
+
+
+class CopyCmd(util.Cmd):
+    """ Command that copies its input files into one output file.
+    """
+
+    def __init__(self, src_glob, dst_path):
+        self.src_glob = src_glob
+        self.dst_path = dst_path
+        self.runs = 0
+
+    def cmd(self, **kwargs):
+        self.runs += 1
+        with open(self.dst_path, 'w') as dst:
+            for src_path in sorted(glob.glob(self.src_glob)):
+                with open(src_path) as src:
+                    dst.write(src.read())
+        return 0
+
+    def env_inputs(self):
+        return ['UTIL_TEST_MODE']
+
+    def help(self):
+        return 'copy'
+
+    def inputs(self):
+        return [self.src_glob]
+
+    def name(self):
+        return 'copy'
+
+    def outputs(self):
+        return [self.dst_path]
+
+
+class testCmdsUpToDate(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.src_path = os.path.join(self.tmp_dir.name, 'a.txt')
+        with open(self.src_path, 'w') as src:
+            src.write('a')
+        self.copy = CopyCmd(os.path.join(self.tmp_dir.name, '*.txt'),
+                            os.path.join(self.tmp_dir.name, 'out.dat'))
+        self.cmds = util.Cmds(self.copy, state_path=os.path.join(self.tmp_dir.name, 'state.json'))
+
+    def test_skip(self):
+        self.assertEqual(self.cmds.do_cmds(['copy']), 0)
+        self.assertEqual(self.cmds.do_cmd('copy'), 0)
+        self.assertEqual(self.copy.runs, 1)
+        self.cmds.do_cmds(['copy'], force_flag=True)
+        self.assertEqual(self.copy.runs, 2)
+
+    def test_changes(self):
+        self.cmds.do_cmds(['copy'])
+        with open(os.path.join(self.tmp_dir.name, 'b.txt'), 'w') as src:
+            src.write('b')
+        self.cmds.do_cmds(['copy'])
+        self.assertEqual(self.copy.runs, 2)
+        os.environ['UTIL_TEST_MODE'] = 'x'
+        self.addCleanup(os.environ.pop, 'UTIL_TEST_MODE')
+        self.cmds.do_cmds(['copy'])
+        self.assertEqual(self.copy.runs, 3)
+        os.remove(self.copy.dst_path)
+        self.cmds.do_cmds(['copy'])
+        self.assertEqual(self.copy.runs, 4)
+        self.cmds.do_cmds(['copy'], mode='other')
+        self.assertEqual(self.copy.runs, 5)
+
+    def test_dry_run(self):
+        self.cmds.do_cmds(['copy'], exec_flag=False)
+        self.cmds.do_cmds(['copy'])
+        self.assertEqual(self.copy.runs, 2)
+
+
+class ArgsCmd(util.Cmd):
+    """ Command that records its arguments.
+    """
+
+    def __init__(self, name, num_args, log, irc=0):
+        self._name = name
+        self._num_args = num_args
+        self._log = log
+        self._irc = irc
+
+    def cmd(self, **kwargs):
+        self._log.append([self._name] + kwargs['args'])
+        return self._irc
+
+    def help(self):
+        return 'args'
+
+    def name(self):
+        return self._name
+
+    def num_args(self):
+        return self._num_args
+
+
+class testDoScript(TestCase):
+
+    def setUp(self):
+        self.log = []
+        self.cmds = util.Cmds(ArgsCmd('pull', 1, self.log), ArgsCmd('tag', 2, self.log),
+                              ArgsCmd('echo', -1, self.log), ArgsCmd('fail', 0, self.log, irc=5))
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def script(self, text):
+        path = os.path.join(self.tmp_dir.name, 'cmds.txt')
+        with open(path, 'w') as script:
+            script.write(text)
+        return path
+
+    def test_run(self):
+        path = self.script("# setup\npull alpine\n\ntag alpine 'my alpine'  # rename\n"
+                           "echo\necho a b c\n")
+        self.assertEqual(self.cmds.do_script(path), 0)
+        self.assertEqual(self.log, [['pull', 'alpine'], ['tag', 'alpine', 'my alpine'],
+                                    ['echo'], ['echo', 'a', 'b', 'c']])
+
+    def test_stdin(self):
+        stdin = sys.stdin
+        sys.stdin = StringIO("pull busybox\nfail\npull alpine\n")
+        try:
+            self.assertEqual(self.cmds.do_script('-'), 5)
+        finally:
+            sys.stdin = stdin
+        self.assertEqual(self.log, [['pull', 'busybox'], ['fail']])
+
+    def test_invalid(self):
+        path = self.script("pull alpine\npull\nnope x\ntag 'a\n")
+        out = StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(self.cmds.do_script(path), 8)
+            self.assertEqual(self.cmds.do_script(path + '.missing'), 8)
+        self.assertEqual(self.log, [])
+        self.assertIn('line 2: pull takes 1 argument(s), not 0', out.getvalue())
+        self.assertIn('line 3: Invalid Command - nope', out.getvalue())
+        self.assertIn('line 4: No closing quotation', out.getvalue())
+
+
+class testDoCmd(TestCase):
+
+    def test_argv(self):
+        result = util.do_sys(['printf', '%s|', 'a b', '$HOME'])
+        self.assertEqual(result.stdout, b'a b|$HOME|')
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result = util.do_sys(['pwd'], cwd=tmp_dir)
+            self.assertEqual(os.path.realpath(result.stdout.decode().strip()),
+                             os.path.realpath(tmp_dir))
+        self.assertEqual(util.do_cmd(['true']), 0)
+
+    def test_spawn_args(self):
+        args = util._popen_args(['env'])
+        self.assertTrue(os.path.isabs(args['args'][0]))
+        self.assertFalse(args['close_fds'])
+        self.assertEqual(args['cwd'], None)
+        self.assertNotIn('shell', args)
+        self.assertTrue(util._popen_args('env')['shell'])
+
+    def test_env(self):
+        result = util.do_sys(['sh', '-c', 'echo $UTIL_TEST_VAR'], env={'UTIL_TEST_VAR': 'x'})
+        self.assertEqual(result.stdout, b'x\n')
+
+    def test_cmd_str(self):
+        self.assertEqual(util.cmd_str(['go', 'fmt', 'a b.go']), "go fmt 'a b.go'")
+        self.assertEqual(util.cmd_str('go version'), 'go version')
+
+
+class testDoSysIter(TestCase):
+
+    def test_both_streams(self):
+        # Enough output on stderr to fill its pipe while stdout is read.
+        script = 'for i in $(seq 20000); do echo err$i >&2; done; echo out; printf last'
+        seen = []
+        lines = list(util.do_sys_iter(['sh', '-c', script],
+                                      callback=lambda stream, line: seen.append(stream)))
+        self.assertEqual(len(lines), 20002)
+        self.assertEqual(len(seen), 20002)
+        self.assertIn(('stdout', 'out'), lines)
+        self.assertIn(('stdout', 'last'), lines)
+        self.assertEqual(lines[0], ('stderr', 'err1'))
+
+    def test_failure_tail(self):
+        script = 'for i in $(seq 1000); do echo line$i; done; echo oops >&2; exit 3'
+        with self.assertRaises(subprocess.CalledProcessError) as ctx:
+            for _ in util.do_sys_iter(['sh', '-c', script], keep=3):
+                pass
+        self.assertEqual(ctx.exception.returncode, 3)
+        self.assertEqual(ctx.exception.stderr, 'oops')
+        self.assertEqual(ctx.exception.output, 'line999\nline1000')
+
+    def test_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired) as ctx:
+            for _ in util.do_sys_iter(['sh', '-c', 'echo started; exec sleep 10'], timeout=0.3):
+                pass
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(ctx.exception.output, 'started')
+
+    def test_early_exit(self):
+        lines = util.do_sys_iter(['sh', '-c', 'echo one; exec sleep 10'])
+        start = time.monotonic()
+        self.assertEqual(next(lines), ('stdout', 'one'))
+        lines.close()
+        self.assertLess(time.monotonic() - start, 5)
+
+
+class testAsyncRunner(TestCase):
+
+    def test_run_many(self):
+        runner = util.AsyncRunner(max_concurrency=2)
+        cmds = [['sh', '-c', 'sleep 0.2; echo {0}'.format(i)] for i in range(4)]
+        cmds.append(['sh', '-c', 'echo bad >&2; exit 2'])
+        start = time.monotonic()
+        results = asyncio.run(runner.run_many(cmds))
+        self.assertGreaterEqual(time.monotonic() - start, 0.4)
+        self.assertEqual([r.stdout for r in results[:4]], [b'0\n', b'1\n', b'2\n', b'3\n'])
+        self.assertIsInstance(results[4], subprocess.CalledProcessError)
+        self.assertEqual(results[4].stderr, b'bad\n')
+
+    def test_timeout(self):
+        runner = util.AsyncRunner()
+        start = time.monotonic()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            asyncio.run(runner.run('exec sleep 10', timeout=0.2))
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_cancel(self):
+        runner = util.AsyncRunner()
+
+        async def cancel_run():
+            task = asyncio.ensure_future(runner.run(['sleep', '10']))
+            await asyncio.sleep(0.2)
+            proc = next(iter(runner._procs))
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            return proc.returncode
+
+        self.assertEqual(asyncio.run(cancel_run()), -15)
+
+    def test_main_coroutine(self):
+        class Main(util.MainBase):
+            async def exec_pgm(self):
+                result = await util.AsyncRunner().run(['sh', '-c', 'exit 0'])
+                self.result_code = result.returncode + 5
+
+        argv = sys.argv
+        sys.argv = ['test']
+        try:
+            with self.assertRaises(SystemExit) as ctx:
+                Main().run()
+        finally:
+            sys.argv = argv
+        self.assertEqual(ctx.exception.code, 5)
+
+
+class testTracer(TestCase):
+
+    def tearDown(self):
+        util.tracer.stop()
+
+    def test_disabled(self):
+        tracer = util.Tracer()
+        with tracer.span('nothing'):
+            pass
+        self.assertEqual(tracer.events(), [])
+
+    def test_spans(self):
+        util.tracer.start()
+        util.do_sys(['true'])
+        threads = [threading.Thread(target=util.do_cmd, args=(['sleep', '0.1'],))
+                   for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        asyncio.run(util.AsyncRunner().run_many([['true'], ['true']]))
+        events = util.tracer.events()
+        spans = [e for e in events if e['ph'] == 'X']
+        self.assertEqual([e['name'] for e in spans], ['true', 'sleep 0.1', 'sleep 0.1'])
+        self.assertNotEqual(spans[1]['tid'], spans[2]['tid'])
+        self.assertGreaterEqual(spans[1]['dur'], 100000)
+        self.assertEqual(sorted(e['ph'] for e in events if e.get('cat') == 'async'),
+                         ['b', 'b', 'e', 'e'])
+        self.assertEqual(len([e for e in events if e['ph'] == 'M']), 3)
+
+    def test_profile(self):
+        class Main(util.MainBase):
+            def exec_pgm(self):
+                util.do_sys(['true'])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'trace.json')
+            argv = sys.argv
+            sys.argv = ['test', '--profile', path]
+            try:
+                with self.assertRaises(SystemExit):
+                    Main().run()
+            finally:
+                sys.argv = argv
+            with open(path) as trace_file:
+                events = json.load(trace_file)['traceEvents']
+        self.assertEqual([e['name'] for e in events if e['ph'] == 'X'],
+                         ['arg_parse', 'true', 'exec_pgm'])
+        self.assertFalse(util.tracer.enabled)
+
+
+class testChildStats(TestCase):
+
+    def tearDown(self):
+        util.child_stats.enabled = False
+
+    def test_records(self):
+        util.child_stats.start()
+        hog = "x = bytearray(64 * 1024 * 1024); sum(range(2000000))"
+        util.do_sys([sys.executable, '-c', hog])
+        util.do_cmd(['true'])
+        with self.assertRaises(subprocess.CalledProcessError):
+            util.do_sys(['sh', '-c', 'exit 3'])
+        list(util.do_sys_iter(['echo', 'hi']))
+        records = util.child_stats.records()
+        self.assertEqual(len(records), 4)
+        self.assertEqual(records[0]['cmd'], util.cmd_str([sys.executable, '-c', hog]))
+        self.assertGreater(records[0]['maxrss_kb'], 60 * 1024)
+        self.assertGreater(records[0]['user'] + records[0]['sys'], 0)
+        self.assertEqual(sorted(r['rc'] for r in records), [0, 0, 0, 3])
+        report = json.loads(util.child_stats.report('json'))
+        self.assertEqual(report['total']['count'], 4)
+        self.assertIn('maxrss(KB)', util.child_stats.report())
+
+    def test_disabled(self):
+        util.do_sys(['true'])
+        self.assertEqual(util.child_stats.records(), [])
+
+    def test_main_stats(self):
+        class Main(util.MainBase):
+            def exec_pgm(self):
+                util.do_sys(['true'])
+
+        argv = sys.argv
+        sys.argv = ['test', '--stats', 'json']
+        out = StringIO()
+        try:
+            with redirect_stdout(out), self.assertRaises(SystemExit):
+                Main().run()
+        finally:
+            sys.argv = argv
+        report, _ = json.JSONDecoder().raw_decode(out.getvalue())
+        self.assertEqual([r['cmd'] for r in report['children']], ['true'])
+
+
+DAEMON_SCRIPT = """
+import os
+import sys
+sys.path.insert(0, './scripts')
+import util
+
+class Main(util.MainBase):
+    def exec_pgm(self):
+        print('args', self.args.args, os.getenv('UTIL_DAEMON_CHILD'), os.getenv('TEST_VAR'))
+        util.do_cmd(['echo', 'child'])
+        self.result_code = 3
+
+if __name__ == '__main__':
+    Main().run()
+"""
+
+
+class testDaemon(TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.socket_path = os.path.join(self.tmp_dir.name, 'daemon.sock')
+        self.script = os.path.join(self.tmp_dir.name, 'script.py')
+        with open(self.script, 'w') as script:
+            script.write(DAEMON_SCRIPT)
+        self.scripts_dir = os.path.dirname(os.path.abspath(util.__file__))
+        self.env = dict(os.environ, UTIL_DAEMON=self.socket_path, TEST_VAR='x',
+                        PYTHONPATH=self.scripts_dir)
+
+    def start(self, idle):
+        daemon = subprocess.Popen([sys.executable, os.path.join(self.scripts_dir, 'util.py'),
+                                   '--daemon', '--socket', self.socket_path, '--idle', idle])
+        self.addCleanup(daemon.wait)
+        self.addCleanup(daemon.terminate)
+        for _ in range(500):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+        return daemon
+
+    def run_script(self, *cmd_line):
+        return subprocess.run(list(cmd_line) + ['a', 'b'], env=self.env,
+                              stdout=subprocess.PIPE, check=False)
+
+    def test_run(self):
+        self.start('10')
+        for client in ([sys.executable, self.script],
+                       [sys.executable, os.path.join(self.scripts_dir, 'warm_run.py'),
+                        self.script]):
+            result = self.run_script(*client)
+            self.assertEqual(result.returncode, 3)
+            lines = result.stdout.decode().splitlines()
+            self.assertEqual(lines[:2], ["args ['a', 'b'] 1 x", 'child'])
+
+    def test_process_pool(self):
+        # git_push_all.py's tree mode pickles its functions for worker processes.
+        root = os.path.join(self.tmp_dir.name, 'root')
+        for name in ('one', 'two'):
+            subprocess.run(['git', 'init', '-q', os.path.join(root, name)], check=True)
+        self.start('10')
+        for _ in range(2):
+            result = subprocess.run([sys.executable,
+                                     os.path.join(self.scripts_dir, 'git_push_all.py'),
+                                     '--noexc', root], env=self.env, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, check=False)
+            self.assertEqual(result.returncode, 0, result.stdout.decode())
+            self.assertNotIn(b'pickle', result.stdout)
+
+    def test_fallback(self):
+        self.addCleanup(subprocess.run, ['pkill', '-f', self.socket_path], check=False)
+        self.assertIsNone(util.daemon_run(self.script, [], self.socket_path, start=False))
+        result = self.run_script(sys.executable, os.path.join(self.scripts_dir, 'warm_run.py'),
+                                 self.script)
+        self.assertEqual(result.stdout.decode().splitlines()[:2],
+                         ["args ['a', 'b'] None x", 'child'])
+        # The in-process run started the daemon for the next run.
+        for _ in range(500):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+        result = self.run_script(sys.executable, self.script)
+        self.assertEqual(result.stdout.decode().splitlines()[0], "args ['a', 'b'] 1 x")
+
+    def copy_util(self):
+        copy_dir = os.path.join(self.tmp_dir.name, 'copy')
+        os.mkdir(copy_dir)
+        for name in ('util.py', 'daemon_socket.py'):
+            shutil.copy2(os.path.join(self.scripts_dir, name), copy_dir)
+        return copy_dir
+
+    def test_other_util(self):
+        self.start('10')
+        self.env['PYTHONPATH'] = self.copy_util()
+        result = self.run_script(sys.executable, os.path.join(self.scripts_dir, 'warm_run.py'),
+                                 self.script)
+        self.assertEqual(result.stdout.decode().splitlines()[0], "args ['a', 'b'] None x")
+
+    def test_stale_util(self):
+        self.addCleanup(subprocess.run, ['pkill', '-f', self.socket_path], check=False)
+        copy_dir = self.copy_util()
+        self.env['PYTHONPATH'] = copy_dir
+        self.scripts_dir = copy_dir
+        daemon = self.start('10')
+        result = self.run_script(sys.executable, self.script)
+        self.assertEqual(result.stdout.decode().splitlines()[0], "args ['a', 'b'] 1 x")
+        util_file = os.path.join(copy_dir, 'util.py')
+        os.utime(util_file, ns=(0, os.stat(util_file).st_mtime_ns + 1000000))
+        result = self.run_script(sys.executable, self.script)
+        self.assertEqual(result.stdout.decode().splitlines()[0], "args ['a', 'b'] None x")
+        self.assertEqual(daemon.wait(timeout=10), 0)
+
+    def test_socket_dir(self):
+        saved = (tempfile.tempdir, os.environ.pop('XDG_RUNTIME_DIR', None))
+        tempfile.tempdir = self.tmp_dir.name
+        try:
+            dir_path = util.daemon_socket_dir()
+            self.assertEqual(os.stat(dir_path).st_mode & 0o777, 0o700)
+            os.chmod(dir_path, 0o777)
+            self.assertIsNone(util.daemon_socket_dir())
+            os.environ['UTIL_DAEMON'] = '1'
+            self.assertIsNone(util.daemon_socket_path())
+        finally:
+            tempfile.tempdir = saved[0]
+            os.environ.pop('UTIL_DAEMON', None)
+            if saved[1] is not None:
+                os.environ['XDG_RUNTIME_DIR'] = saved[1]
+
+    def test_socket_path(self):
+        # util and warm_run.py find the same daemon for UTIL_DAEMON=1.
+        runtime_dir = os.path.join(self.tmp_dir.name, 'run')
+        os.mkdir(runtime_dir, 0o700)
+        self.env.update(UTIL_DAEMON='1', XDG_RUNTIME_DIR=runtime_dir)
+        with mock.patch.dict(os.environ, UTIL_DAEMON='1', XDG_RUNTIME_DIR=runtime_dir):
+            self.socket_path = util.daemon_socket_path()
+        self.assertEqual(os.path.dirname(self.socket_path), runtime_dir)
+        self.start('10')
+        for client in ([sys.executable, self.script],
+                       [sys.executable, os.path.join(self.scripts_dir, 'warm_run.py'),
+                        self.script]):
+            result = self.run_script(*client)
+            self.assertEqual(result.stdout.decode().splitlines()[0], "args ['a', 'b'] 1 x")
+
+    def test_peer_uid(self):
+        left, right = socket.socketpair(socket.AF_UNIX)
+        with left, right:
+            self.assertEqual(util._peer_uid(left), os.getuid())
+
+    def test_idle(self):
+        daemon = self.start('0.3')
+        self.assertEqual(daemon.wait(timeout=10), 0)
+        self.assertFalse(os.path.exists(self.socket_path))
+
+
+class testDockerImageInventory(TestCase):
+
+    def setUp(self):
+        self.calls = 0
+
+    def loader(self):
+        self.calls += 1
+        return [{'Repository': 'alpine', 'Tag': 'latest', 'ID': '1'},
+                {'Repository': 'alpine', 'Tag': '3.12', 'ID': '2'}]
+
+    def test_find(self):
+        inventory = util.DockerImageInventory(ttl=60)
+        self.assertEqual(inventory.find('alpine', '3.12', self.loader)['ID'], '2')
+        self.assertEqual(inventory.find('alpine', 'latest', self.loader)['ID'], '1')
+        self.assertEqual(inventory.find('busybox', 'latest', self.loader), None)
+        self.assertEqual(self.calls, 1)
+        inventory.invalidate()
+        inventory.find('alpine', 'latest', self.loader)
+        self.assertEqual(self.calls, 2)
+
+    def test_ttl(self):
+        inventory = util.DockerImageInventory(ttl=0)
+        inventory.find('alpine', 'latest', self.loader)
+        inventory.find('alpine', 'latest', self.loader)
+        self.assertEqual(self.calls, 2)
+
+    def test_shared_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'images.json')
+            first = util.DockerImageInventory(path=path)
+            second = util.DockerImageInventory(path=path)
+            self.assertEqual(first.find('alpine', '3.12', self.loader)['ID'], '2')
+            self.assertEqual(second.find('alpine', '3.12', self.loader)['ID'], '2')
+            self.assertEqual(self.calls, 1)
+            first.invalidate()
+            third = util.DockerImageInventory(path=path)
+            third.find('alpine', '3.12', self.loader)
+            self.assertEqual(self.calls, 2)
+
+    def test_path_env(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            inventory = util.DockerImageInventory(path_env='TEST_IMAGE_CACHE')
+            self.assertIsNone(inventory.path)
+            path = os.path.join(tmp_dir, 'images.json')
+            with mock.patch.dict(os.environ, TEST_IMAGE_CACHE=path):
+                self.assertEqual(inventory.path, path)
+                inventory.find('alpine', '3.12', self.loader)
+            self.assertTrue(os.path.exists(path))
+
+
+class testDockerImages(StandInTestCase):
+
+    def test_no_images(self):
+        stand_in(self.bin_dir, 'docker', 'exit 0\n')
+        self.assertEqual(util.DockerImage('alpine').images(), [])
+        self.assertEqual(util.DockerImage('alpine').find(), None)
+
+    def test_noise(self):
+        stand_in(self.bin_dir, 'docker',
+                 'echo "WARNING: something odd" >&2\n'
+                 'echo \'{"Repository":"alpine","Tag":"latest","ID":"1"}\'\n'
+                 'echo \'{"Repository":"busybox",\'\n'
+                 'echo \'{"Repository":"alpine","Tag":"3.12","ID":"2"}\'\n')
+        images = util.DockerImage('alpine').images()
+        self.assertEqual([image['ID'] for image in images], ['1', '2'])
+        self.assertEqual(util.DockerImage('alpine', '3.12').find()['ID'], '2')
+
+    def test_early_exit(self):
+        stand_in(self.bin_dir, 'docker',
+                 'echo \'{"Repository":"alpine","Tag":"latest","ID":"1"}\'\n'
+                 'exec sleep 30\n')
+        ttl = util.docker_image_inventory.ttl
+        util.docker_image_inventory.ttl = 0
+        try:
+            start = time.time()
+            self.assertEqual(util.DockerImage('alpine').find()['ID'], '1')
+            self.assertLess(time.time() - start, 10)
+        finally:
+            util.docker_image_inventory.ttl = ttl
+
+
+DOCKER_STAND_IN = '''echo "$*" >> "$STAND_IN_LOG"
+case "$1 $2" in
+"image ls")
+    for image in $(cat "$STAND_IN_LOG.pulled" 2>/dev/null); do
+        echo "{\\"Repository\\":\\"${image%:*}\\",\\"Tag\\":\\"${image#*:}\\",\\"ID\\":\\"1\\"}"
+    done ;;
+"image pull")
+    sleep 0.3
+    case "$3" in
+    *missing*) exit 1 ;;
+    esac
+    echo "$3" >> "$STAND_IN_LOG.pulled" ;;
+esac
+exit 0
+'''
+
+
+class testDockerPull(StandInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        stand_in(self.bin_dir, 'docker', DOCKER_STAND_IN)
+
+    def pulls(self):
+        return [call for call in self.calls() if call.startswith('image pull')]
+
+    def test_threads(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            util.DockerImage('alpine', '3.12').pull())) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [None] * 4)
+        self.assertEqual(self.pulls(), ['image pull alpine:3.12'])
+        # The image is now in the inventory so it is not pulled again.
+        self.assertEqual(util.DockerImage('alpine', '3.12').pull(), None)
+        self.assertEqual(len(self.pulls()), 1)
+
+    def test_asyncio(self):
+        async def pull_all():
+            image = util.DockerImage('busybox')
+            return await asyncio.gather(image.pull_async(), image.pull_async())
+        self.assertEqual(asyncio.run(pull_all()), [None, None])
+        self.assertEqual(self.pulls(), ['image pull busybox:latest'])
+
+    def test_container_run(self):
+        self.assertEqual(util.DockerContainer('alpine').run(), None)
+        self.assertEqual(self.pulls(), ['image pull alpine:latest'])
+
+    def test_failure(self):
+        err = util.DockerImage('missing').pull()
+        self.assertIsInstance(err, util.Error)
+
+    def test_pull_many(self):
+        with open(self.log_path + '.pulled', 'w') as f:
+            f.write('alpine:3.12\n')
+        reports = []
+        err = util.DockerImage.pull_many(
+            ['alpine:3.12', 'busybox', ('nginx', '1.19'), 'localhost:5000/app',
+             'missing:1'], jobs=3,
+            progress=lambda name, err, elapsed: reports.append((name, err is None)))
+        self.assertIsInstance(err, util.Error)
+        self.assertEqual(err.error(), 'Error: could not pull 1 image(s): missing:1')
+        self.assertEqual(sorted(reports), [('alpine:3.12', True), ('busybox:latest', True),
+                                           ('localhost:5000/app:latest', True),
+                                           ('missing:1', False), ('nginx:1.19', True)])
+        self.assertEqual(sorted(self.pulls()), ['image pull busybox:latest',
+                                                'image pull localhost:5000/app:latest',
+                                                'image pull missing:1',
+                                                'image pull nginx:1.19'])
+        self.assertEqual(self.calls().count('image ls --format {{json .}}'), 1)
+
+    def test_split_image_name(self):
+        self.assertEqual(util.split_image_name('alpine'), ('alpine', 'latest'))
+        self.assertEqual(util.split_image_name('alpine:3.12'), ('alpine', '3.12'))
+        self.assertEqual(util.split_image_name('host:5000/app'), ('host:5000/app', 'latest'))
+
+
+class DockerApiHandler(BaseHTTPRequestHandler):
+    """ Stand-in for the Docker Engine API.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def log_message(self, format, *args):    # pylint: disable=redefined-builtin
+        pass
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path))
+        images = [{'Id': 'sha256:0123456789abcdef', 'RepoTags': ['alpine:3.12', 'alpine:latest'],
+                   'Created': 0, 'Size': 5}]
+        self.reply(200, json.dumps(images).encode())
+
+    def do_POST(self):
+        self.server.requests.append(('POST', self.path))
+        if 'missing' in self.path:
+            self.reply(200, b'{"status":"Pulling"}\r\n{"error":"not found"}\r\n')
+        else:
+            self.reply(200, b'{"status":"Pulling"}\r\n{"status":"Done"}\r\n')
+
+    def do_DELETE(self):
+        self.server.requests.append(('DELETE', self.path))
+        self.reply(200, b'[]')
+
+
+class testDockerApi(StandInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        stand_in(self.bin_dir, 'docker', DOCKER_STAND_IN)
+        self.socket_path = os.path.join(self.bin_dir, 'docker.sock')
+        self.server = socketserver.ThreadingUnixStreamServer(self.socket_path, DockerApiHandler)
+        self.server.daemon_threads = True
+        self.server.connections = 0
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.api = util.DockerApi(self.socket_path, timeout=10)
+
+    def tearDown(self):
+        self.api.close()
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        super().tearDown()
+
+    def test_images(self):
+        images = util.DockerImage('alpine', backend=self.api).images()
+        self.assertEqual([(image['Repository'], image['Tag'], image['ID']) for image in images],
+                         [('alpine', '3.12', '0123456789ab'), ('alpine', 'latest', '0123456789ab')])
+        self.assertEqual(util.DockerImage('alpine', '3.12', backend=self.api).pull(), None)
+        self.assertEqual(self.server.requests, [('GET', '/images/json')] * 2)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.calls(), [])
+
+    def test_pull(self):
+        self.assertEqual(util.DockerImage('busybox', backend=self.api).pull(), None)
+        err = util.DockerImage('missing', backend=self.api).pull()
+        self.assertIsInstance(err, util.Error)
+        self.assertTrue(err.error().startswith('Error: could not pull image missing:latest: '))
+        self.assertIn(('POST', '/images/create?fromImage=busybox&tag=latest'),
+                      self.server.requests)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(self.calls(), [])
+
+    def test_container_run(self):
+        self.assertEqual(util.DockerContainer('alpine', backend=self.api).run(force_flag=True), None)
+        self.assertEqual([request[0] for request in self.server.requests],
+                         ['DELETE', 'GET', 'DELETE', 'POST'])
+        self.assertEqual(self.server.connections, 1)
+
+    def test_fallback(self):
+        api = util.DockerApi(os.path.join(self.bin_dir, 'nothing.sock'))
+        self.assertEqual(util.DockerImage('busybox', backend=api).pull(), None)
+        self.assertEqual(self.calls()[-1], 'image pull busybox:latest')
+
+
+GO_STAND_IN = '''echo "$*" >> "$STAND_IN_LOG"
+case "$1" in
+version) echo "go version go0.0 stand-in" ;;
+get)
+    case "$2" in
+    *bad*) echo "cannot find $2" >&2; exit 1 ;;
+    *nomirror*) [ -z "$GOMODCACHE" ] || { echo "cannot mirror $2" >&2; exit 1; } ;;
+    esac
+    case "$GOPROXY" in
+    file://*) echo "proxy $GOPROXY $GOSUMDB" >> "$STAND_IN_LOG" ;;
+    esac
+    if [ -n "$GOMODCACHE" ]; then
+        echo "flags $GOFLAGS" >> "$STAND_IN_LOG"
+        mkdir -p "$GOMODCACHE/cache/download/${2%@*}/@v"
+        echo "v1.0.0" > "$GOMODCACHE/cache/download/${2%@*}/@v/list"
+    fi ;;
+fmt) shift; for f in "$@"; do case "$f" in *ugly*) echo "$f" ;; esac; done ;;
+list) [ -z "$GO_LIST_DEPS" ] || echo "$GO_LIST_DEPS" ;;
+build)
+    echo "compiling $3"
+    case "$3" in
+    */bad) exit 2 ;;
+    esac
+    echo "binary" > "$3" ;;
+esac
+exit 0
+'''
+
+
+class GoTestCase(StandInTestCase):
+
+    def setUp(self):
+        super().setUp()
+        stand_in(self.bin_dir, 'go', GO_STAND_IN)
+        self.old_tmp = os.environ.get('TMP')
+        os.environ['TMP'] = os.path.join(self.bin_dir, 'tmp')
+        self.old_cwd = os.getcwd()
+        os.chdir(self.bin_dir)
+        os.makedirs(os.path.join('cmd', 'app'))
+        self.write_src('main.go', 'package main\n')
+        self.write_src('util.go', 'package main\n')
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        if self.old_tmp is None:
+            del os.environ['TMP']
+        else:
+            os.environ['TMP'] = self.old_tmp
+        super().tearDown()
+
+    def write_src(self, name, text, app='app'):
+        with open(os.path.join('cmd', app, name), 'w') as f:
+            f.write(text)
+
+    def go_calls(self, verb):
+        return [call for call in self.calls() if call.split()[0] == verb]
+
+
+class testGoBuildCache(GoTestCase):
+
+    def test_skip(self):
+        self.assertEqual(util.go_build_app('cmd', 'app'), None)
+        self.assertEqual(len(self.go_calls('build')), 1)
+        self.assertEqual(util.go_build_app('cmd', 'app'), None)
+        self.assertEqual(len(self.go_calls('build')), 1)
+        self.assertEqual(len(self.go_calls('fmt')), 1)
+
+    def test_changes(self):
+        self.assertEqual(util.go_build_app('cmd', 'app'), None)
+        self.write_src('util.go', 'package main\n\nfunc f() {}\n')
+        self.assertEqual(util.go_build_app('cmd', 'app'), None)
+        self.assertEqual(len(self.go_calls('build')), 2)
+        os.remove(os.path.join(os.environ['TMP'], 'bin', 'app'))
+        self.assertEqual(util.go_build_app('cmd', 'app'), None)
+        self.assertEqual(len(self.go_calls('build')), 3)
+        self.assertEqual(util.go_build_app('cmd', 'app', force=True), None)
+        self.assertEqual(len(self.go_calls('build')), 4)
+
+    def test_module_changes(self):
+        with open('go.mod', 'w') as f:
+            f.write('module example.com/app\n')
+        lib_dir = os.path.join(os.getcwd(), 'lib')
+        os.mkdir(lib_dir)
+        with open(os.path.join(lib_dir, 'lib.go'), 'w') as f:
+            f.write('package lib\n')
+        with mock.patch.dict(os.environ, GO_LIST_DEPS=lib_dir):
+            self.assertEqual(util.go_build_app('cmd', 'app'), None)
+            self.assertEqual(util.go_build_app('cmd', 'app'), None)
+            self.assertEqual(len(self.go_calls('build')), 1)
+            with open('go.mod', 'a') as f:
+                f.write('\nrequire example.com/dep v1.0.0\n')
+            self.assertEqual(util.go_build_app('cmd', 'app'), None)
+            self.assertEqual(len(self.go_calls('build')), 2)
+            with open(os.path.join(lib_dir, 'lib.go'), 'a') as f:
+                f.write('\nfunc F() {}\n')
+            self.assertEqual(util.go_build_app('cmd', 'app'), None)
+            self.assertEqual(len(self.go_calls('build')), 3)
+            self.assertEqual(util.go_build_app('cmd', 'app'), None)
+            self.assertEqual(len(self.go_calls('build')), 3)
+
+    def test_no_sources(self):
+        os.makedirs(os.path.join('cmd', 'empty'))
+        err = util.go_build_app('cmd', 'empty')
+        self.assertIsInstance(err, util.Error)
+        self.assertIn('no go source files found', err.error())
+
+    def test_fmt_changed_only(self):
+        self.assertEqual(util.go_build_app('cmd', 'app'), None)
+        self.write_src('ugly.go', 'package   main\n')
+        out = StringIO()
+        with redirect_stdout(out):
+            self.assertEqual(util.go_build_app('cmd', 'app'), None)
+        ugly = os.path.join(os.getcwd(), 'cmd', 'app', 'ugly.go')
+        self.assertEqual(self.go_calls('fmt')[-1], 'fmt ' + ugly)
+        self.assertIn('\tgo fmt: {0} reformatted'.format(ugly), out.getvalue().splitlines())
+
+
+class testGoBuildMany(GoTestCase):
+
+    def test_many(self):
+        for app in ('app2', 'bad'):
+            os.makedirs(os.path.join('cmd', app))
+            self.write_src('main.go', 'package main\n', app)
+        out = StringIO()
+        with redirect_stdout(out):
+            results = util.go_build_many('cmd', ['app', 'app2', 'bad'], jobs=3)
+        self.assertEqual([result.app_name for result in results], ['app', 'app2', 'bad'])
+        self.assertEqual(results[0].error, None)
+        self.assertEqual(results[1].error, None)
+        self.assertIsInstance(results[2].error, util.Error)
+        self.assertIn('failed', results[2].error.error())
+        lines = out.getvalue().splitlines()
+        self.assertIn('[app2] compiling {0}'.format(
+            os.path.join(os.environ['TMP'], 'bin', 'app2')), lines)
+        self.assertEqual(len(self.go_calls('fmt')), 3)
+
+
+class testGoGetMany(GoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.go_dir = os.path.join(self.bin_dir, 'gopath')
+        os.makedirs(os.path.join(self.go_dir, 'src', 'github.com', 'a', 'b'))
+        os.makedirs(os.path.join(self.go_dir, 'pkg', 'mod', 'github.com', '!x', 'y@v1.0.0'))
+        os.makedirs(os.path.join(self.go_dir, 'pkg', 'mod', 'cache', 'download'))
+
+    def test_index(self):
+        index = util.GoPackageIndex(self.go_dir)
+        self.assertTrue(index.contains('github.com/a/b'))
+        self.assertTrue(index.contains('github.com/X/y/sub@latest'))
+        self.assertFalse(index.contains('github.com/a/c'))
+        self.assertFalse(index.contains('github.com/x/y'))
+        self.assertEqual(index.modules(), {'github.com/X/y'})
+
+    def test_index_versions(self):
+        os.makedirs(os.path.join(self.go_dir, 'pkg', 'mod', 'github.com', 'x', 'y@v1.0.0'))
+        index = util.GoPackageIndex(self.go_dir)
+        self.assertTrue(index.contains('github.com/x/y@v1.0.0'))
+        self.assertTrue(index.contains('github.com/x/y/sub@v1.0.0'))
+        self.assertTrue(index.contains('github.com/x/y@latest'))
+        self.assertFalse(index.contains('github.com/x/y@v1.1.0'))
+        self.assertFalse(index.contains('github.com/x/y@v2.0.0'))
+        self.assertFalse(index.contains('github.com/x/y/v2@v2.0.0'))
+        self.assertFalse(index.contains('github.com/x/y/v2'))
+        self.assertFalse(index.contains('github.com/x/y@master'))
+        self.assertTrue(index.contains('github.com/X/y@v1.0.0'))
+
+    def test_go_get_src(self):
+        # Only 'src' counts for go_get, not the module cache.
+        util.go_get('github.com/a/b', go_dir=self.go_dir)
+        util.go_get('github.com/X/y/sub', go_dir=self.go_dir)
+        self.assertEqual(self.go_calls('get'), ['get github.com/X/y/sub'])
+
+    def test_get_many(self):
+        results = util.go_get_many(['github.com/a/b', 'github.com/X/y/sub', 'github.com/c/d',
+                                    'github.com/e/f', 'github.com/bad/pkg', 'github.com/c/d'],
+                                   go_dir=self.go_dir, jobs=2)
+        self.assertEqual(list(results), ['github.com/a/b', 'github.com/X/y/sub',
+                                         'github.com/c/d', 'github.com/e/f',
+                                         'github.com/bad/pkg'])
+        self.assertFalse(results['github.com/a/b'].fetched)
+        self.assertFalse(results['github.com/X/y/sub'].fetched)
+        self.assertTrue(results['github.com/c/d'].fetched)
+        self.assertEqual(results['github.com/c/d'].error, None)
+        self.assertIsInstance(results['github.com/bad/pkg'].error, util.Error)
+        self.assertIn('cannot find', results['github.com/bad/pkg'].error.error())
+        self.assertEqual(sorted(self.go_calls('get')), ['get github.com/bad/pkg',
+                                                        'get github.com/c/d',
+                                                        'get github.com/e/f'])
+
+
+class testGoModMirror(GoTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.mirror = util.GoModMirror(os.path.join(self.bin_dir, 'mirror'))
+        self.go_dir = os.path.join(self.bin_dir, 'gopath')
+
+    def test_layout(self):
+        self.assertEqual(self.mirror.proxy_url(),
+                         'file://' + os.path.join(self.mirror.path, 'cache', 'download'))
+        self.assertEqual(util.go_mod_escape('github.com/BurntSushi/toml'),
+                         'github.com/!burnt!sushi/toml')
+        self.assertEqual(util.go_mod_unescape('github.com/!burnt!sushi/toml'),
+                         'github.com/BurntSushi/toml')
+        version_dir = os.path.join(self.mirror.proxy_dir(), 'github.com', '!x', 'y', '@v')
+        os.makedirs(version_dir)
+        with open(os.path.join(version_dir, 'list'), 'w') as f:
+            f.write('v1.0.0\n')
+        with open(os.path.join(version_dir, 'v1.0.0.zip'), 'w') as f:
+            f.write('zip')
+        self.assertTrue(self.mirror.contains('github.com/X/y/sub'))
+        self.assertTrue(self.mirror.contains('github.com/X/y@v1.0.0'))
+        self.assertFalse(self.mirror.contains('github.com/X/y@v2.0.0'))
+        self.assertFalse(self.mirror.contains('github.com/x/z'))
+
+    def test_go_get(self):
+        util.go_get('example.com/a', go_dir=self.go_dir, mirror=self.mirror)
+        self.assertTrue(self.mirror.contains('example.com/a'))
+        self.assertEqual(self.mirror.stats(), {'hits': 0, 'misses': 1, 'hit_rate': 0.0})
+        util.go_get('example.com/a', go_dir=self.go_dir, mirror=self.mirror)
+        self.assertEqual(self.mirror.stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+        self.assertEqual(self.go_calls('mod'), ['mod init mirror.prefetch'])
+        self.assertEqual(self.go_calls('proxy'),
+                         ['proxy ' + self.mirror.env()['GOPROXY'] + ' '] * 2)
+
+    def test_env(self):
+        url = self.mirror.proxy_url()
+        with mock.patch.dict(os.environ, GOPROXY='', GOFLAGS='-mod=mod'):
+            self.assertEqual(self.mirror.env(),
+                             {'GOPROXY': url + ',https://proxy.golang.org,direct'})
+            util.go_get('example.com/a', go_dir=self.go_dir, mirror=self.mirror)
+            self.assertEqual(self.go_calls('flags'), ['flags -mod=mod -modcacherw'])
+        with mock.patch.dict(os.environ, GOPROXY=url + ',https://corp.example.com'):
+            self.assertEqual(self.mirror.env(), {'GOPROXY': url + ',https://corp.example.com'})
+        with mock.patch.dict(os.environ, GO_MOD_MIRROR=self.mirror.path,
+                             GO_MOD_MIRROR_OFFLINE='1'):
+            self.assertEqual(util.GoModMirror.default().env(), {'GOPROXY': url, 'GOSUMDB': 'off'})
+
+    def test_fill_failure(self):
+        err = StringIO()
+        with redirect_stderr(err):
+            util.go_get('example.com/nomirror', go_dir=self.go_dir, mirror=self.mirror)
+        self.assertIn('example.com/nomirror is not in the mirror', err.getvalue())
+        self.assertEqual(self.go_calls('get')[-1], 'get example.com/nomirror')
+        self.assertEqual(self.go_calls('proxy'), ['proxy ' + self.mirror.env()['GOPROXY'] + ' '])
+
+    def test_go_get_many(self):
+        results = util.go_get_many(['example.com/a', 'example.com/b'], go_dir=self.go_dir,
+                                   mirror=self.mirror)
+        self.assertEqual([result.error for result in results.values()], [None, None])
+        self.assertEqual(self.mirror.stats()['misses'], 2)
+        self.assertEqual(len(self.go_calls('proxy')), 2)
+
+
 ################################################################################
 #                           Command-line interface
 ################################################################################
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+""" Run a script in the util warm daemon
+
+    warm_run.py script.py [arg...]
+
+This sends the script, its arguments, the environment and the current
+directory to the daemon given by UTIL_DAEMON (see util.daemon_socket_path())
+and exits with the script's exit code.  The daemon gets this process's
+stdin, stdout and stderr.  If the daemon is not running, the script is run
+in this process as usual, which starts the daemon for the next time.  The
+same happens when the daemon refuses the script because it was started from
+another util.py than the one the script imports, or an older version of it.
+
+This does the same as util.daemon_run() but does not import util, whose
+import is most of the start up time that the daemon saves.  The socket is
+found, and its owner checked, by daemon_socket.py like util does it.
+"""
+
+
+#   This is free and unencumbered software released into the public domain.
+#
+#   Anyone is free to copy, modify, publish, use, compile, sell, or
+#   distribute this software, either in source code form or as a compiled
+#   binary, for any purpose, commercial or non-commercial, and by any
+#   means.
+#
+#   In jurisdictions that recognize copyright laws, the author or authors
+#   of this software dedicate any and all copyright interest in the
+#   software to the public domain. We make this dedication for the benefit
+#   of the public at large and to the detriment of our heirs and
+#   successors. We intend this dedication to be an overt act of
+#   relinquishment in perpetuity of all present and future rights to this
+#   software under copyright law.
+#
+#   THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+#   EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+#   MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+#   IN NO EVENT SHALL THE AUTHORS BE LIABLE FOR ANY CLAIM, DAMAGES OR
+#   OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE,
+#   ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE
+#   OR OTHER DEALINGS IN THE SOFTWARE.
+#
+#   For more information, please refer to <http://unlicense.org/>
+
+
+
+import json
+import os
+import runpy
+import socket
+import sys
+import daemon_socket
+
+
+def util_file(script):
+    """ Return the util.py that script imports, the one in ./scripts, next to
+        the script or on PYTHONPATH, else the one next to this file.
+    """
+    dirs = [os.path.join(os.getcwd(), 'scripts'), os.path.dirname(script)]
+    dirs += [dir_path for dir_path in os.getenv('PYTHONPATH', '').split(os.pathsep) if dir_path]
+    for dir_path in dirs:
+        file_path = os.path.join(dir_path, 'util.py')
+        if os.path.isfile(file_path):
+            return os.path.realpath(file_path)
+    return os.path.join(os.path.dirname(os.path.realpath(__file__)), 'util.py')
+
+
+def wait_exit(sock):
+    """ Wait for the daemon to run the script.
+
+        Returns:
+            exit code
+    """
+    reply = b''
+    try:
+        while not reply.endswith(b'\n'):
+            data = sock.recv(64)
+            if not data:
+                break
+            reply += data
+    except KeyboardInterrupt:
+        return 130
+    try:
+        return int(reply)
+    except ValueError:
+        print("Error: the daemon did not return an exit code", file=sys.stderr)
+        return 1
+
+
+def main(argv):
+    """ Run argv[0] with the arguments argv[1:].
+
+        Returns:
+            exit code
+    """
+    if not argv:
+        print("usage: warm_run.py script.py [arg...]", file=sys.stderr)
+        return 4
+    script = os.path.abspath(argv[0])
+    util_path = util_file(script)
+    socket_path = daemon_socket.socket_path(util_path)
+    sock = None
+    if socket_path:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+            if daemon_socket.peer_uid(sock) != os.getuid():
+                raise OSError("{0} is not served by this user".format(socket_path))
+        except OSError:
+            sock.close()
+            sock = None
+    if sock is not None:
+        with sock:
+            request = {'script': script, 'argv': argv[1:], 'cwd': os.getcwd(),
+                       'env': dict(os.environ), 'util': util_path}
+            try:
+                socket.send_fds(sock, [b'R'], [0, 1, 2])
+                sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+                accepted = sock.recv(1) == b'+'
+            except OSError:
+                accepted = False
+            if accepted:
+                return wait_exit(sock)
+    sys.argv = [script] + argv[1:]
+    sys.path[0] = os.path.dirname(script)
+    runpy.run_path(script, run_name='__main__')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))